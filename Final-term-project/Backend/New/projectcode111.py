@@ -1,12 +1,78 @@
 import os
+import re
+import sys
 import json
+import base64
+import bisect
+import glob
+import sqlite3
+import hashlib
+import hmac
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import random
+try:
+    import fcntl  # file locks (Linux/macOS)
+except ImportError:
+    fcntl = None
+    import msvcrt  # file locks (Windows)
 
 # ============ FILE PATHS ====================
 USERS_FILE = "users.json"
-EVENTS_FILE = "events.json"
-BOOKINGS_FILE = "user_bookings.json"
+EVENTS_FILE = "events.json"  # old single file layout, migrated into EVENTS_DIR
+BOOKINGS_FILE = "user_bookings.json"  # old per-user copy of the bookings, only read for ticket ids
+CHECKINS_FILE = "checkins.jsonl"
+TICKET_KEY_FILE = "ticket_secret.key"  # signing key for ticket codes, copy it to the gates
+EVENTS_DIR = "events"
+NODES_DIR = "nodes"  # one lock file per node number in use, see get_node_id
+MANIFEST_FILE = os.path.join(EVENTS_DIR, "manifest.json")
+MANIFEST_JOURNAL = os.path.join(EVENTS_DIR, "manifest.journal")
+
+DB_FILE = "carnival.db"
+ADMISSION_DB = "admission.db"  # waiting room queues and seat holds, shared by every terminal
+
+# Number of journal records after which they are folded back into the event file
+JOURNAL_COMPACT_EVERY = 200
+
+# How often a change is retried when another process changed the event first
+SAVE_RETRIES = 10
+
+# Storage backend: "json" (the files above) or "sqlite" (DB_FILE)
+STORAGE_BACKEND = os.environ.get("CARNIVAL_STORAGE", "json")
+
+# Local payment stub settings (seconds per payment / share of declined payments)
+PAYMENT_LATENCY = float(os.environ.get("CARNIVAL_PAYMENT_LATENCY", "2"))
+PAYMENT_FAILURE_RATE = float(os.environ.get("CARNIVAL_PAYMENT_FAILURE_RATE", "0.1"))
+PAYMENT_WORKERS = 32  # payments that can be in flight at the same time
+
+# How long seats stay held for a user during checkout (seconds)
+HOLD_SECONDS = 300
+
+# Vendor applications shown per page when reviewing them
+REVIEW_PAGE_SIZE = 10
+
+# How long a freed seat stays held for the next person on the waitlist (seconds)
+WAITLIST_HOLD_SECONDS = 30 * 60
+
+# Admission control per event: checkouts let in per second (and how many can
+# be let in at once after a quiet spell), checkouts running at the same time,
+# and how long someone waits in the queue before giving up (seconds)
+ADMISSION_RATE = float(os.environ.get("CARNIVAL_ADMISSION_RATE", "20"))
+ADMISSION_BURST = int(os.environ.get("CARNIVAL_ADMISSION_BURST", "50"))
+MAX_CHECKOUTS = int(os.environ.get("CARNIVAL_MAX_CHECKOUTS", "100"))
+ADMISSION_TIMEOUT = 15 * 60
+
+# A waiter that hasn't checked its place for this long has gone away (closed
+# terminal), and a checkout let in this long ago no longer counts as inside
+QUEUE_STALE_SECONDS = 10
+CHECKOUT_STALE_SECONDS = 2 * HOLD_SECONDS
+
+# Node number (0-1023) put in ticket ids. Unset, every process locks a free
+# one in NODES_DIR; set it for machines that don't share that folder
+NODE_ID = os.environ.get("CARNIVAL_NODE_ID")
 
 # ==================== UTILITY FUNCTIONS ====================
 
@@ -24,10 +90,79 @@ def pause():
     """Pause and wait for user input"""
     input("\nPress Enter to continue...")
 
+# ============= FILE CACHE ===============
+# Parsed files are kept in memory and shared by every menu action.
+# An entry is reused until the file's (mtime, size) on disk changes,
+# so edits made by another process are still picked up.
+# NOTE: callers get the cached dict itself, so a change that is not
+# followed by a save_* call must be undone (or invalidate_cache() called).
+
+_file_cache = {}  # path -> (signature, parsed data)
+cache_stats = {'hits': 0, 'misses': 0}
+_saved_json = {'users': {}}  # key -> json as last saved (events: see remember_fields)
+
+def file_signature(path):
+    """Return (mtime, size) of a file, or None if it doesn't exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def load_json_cached(path):
+    """Return the parsed JSON file, re-reading it only if it changed on disk"""
+    signature = file_signature(path)
+    if signature is None:
+        _file_cache.pop(path, None)
+        return {}
+    
+    cached = _file_cache.get(path)
+    if cached and cached[0] == signature:
+        cache_stats['hits'] += 1
+        return cached[1]
+    
+    cache_stats['misses'] += 1
+    with open(path, 'r') as f:
+        data = json.load(f)
+    _file_cache[path] = (signature, data)
+    return data
+
+def save_json_cached(path, data):
+    """Write the data to file and keep it as the cached copy (write-through)"""
+    # write to a temp file first so a crash never leaves a half written file
+    temp_path = f"{path}.{os.getpid()}.tmp"  # other processes may be saving it too
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=2, default=json_default)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    _file_cache[path] = (file_signature(path), data)
+
+def changed_keys(name, data):
+    """Return (changed keys, removed keys) of data since it was last loaded/saved"""
+    saved = _saved_json[name]
+    current = {key: fingerprint(value) for key, value in data.items()}
+    changed = [key for key in current if saved.get(key) != current[key]]
+    removed = [key for key in saved if key not in current]
+    _saved_json[name] = current
+    return changed, removed
+
+def invalidate_cache(path=None):
+    """Drop one cached file (or all of them) so the next load re-reads it"""
+    if path is None:
+        _file_cache.clear()
+        _sql_cache.clear()
+    else:
+        _file_cache.pop(path, None)
+
 # ======= FILE OPERATIONS ====================
 
 def initialize_files():
     """Create JSON files if they don't exist"""
+    if STORAGE_BACKEND == 'sqlite':
+        initialize_db()
+        return
+    
     if not os.path.exists(USERS_FILE):
         default_users = {
             'admin': {
@@ -39,102 +174,1392 @@ def initialize_files():
         with open(USERS_FILE, 'w') as f:
             json.dump(default_users, f, indent=2)
     
-    if not os.path.exists(EVENTS_FILE):
-        with open(EVENTS_FILE, 'w') as f:
-            json.dump({}, f, indent=2)
-    
-    if not os.path.exists(BOOKINGS_FILE):
-        with open(BOOKINGS_FILE, 'w') as f:
-            json.dump({}, f, indent=2)
+    if not os.path.exists(MANIFEST_FILE):
+        os.makedirs(EVENTS_DIR, exist_ok=True)
+        # move events from the old single file into per-event files
+        # (events.json is left in place but no longer used)
+        if os.path.exists(EVENTS_FILE):
+            with open(EVENTS_FILE, 'r') as f:
+                save_events(json.load(f))
+        compact_manifest(0)
 
 def load_users():
     """Load users from file"""
-    try:
-        with open(USERS_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+    if STORAGE_BACKEND == 'sqlite':
+        return sql_load_users()
+    return load_json_cached(USERS_FILE)
 
 def save_users(users):
     """Save users to file"""
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f, indent=2)
+    if STORAGE_BACKEND == 'sqlite':
+        sql_save_users(users)
+        return
+    save_json_cached(USERS_FILE, users)
 
 def load_events():
-    """Load events from file"""
-    try:
-        with open(EVENTS_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+    """Load all events (event files + any journaled changes)"""
+    if STORAGE_BACKEND == 'sqlite':
+        return sql_load_events()
+    events = {}
+    for event_id in load_manifest():
+        event = load_event_file(event_id)
+        if event:
+            events[event_id] = event
+    return events
 
 def save_events(events):
-    """Save events to file"""
-    with open(EVENTS_FILE, 'w') as f:
-        json.dump(events, f, indent=2)
+    """Save events to file
+    new events get their own file and edits to an existing event are
+    journaled as an 'update' of just the changed fields (so bookings other
+    processes made in the meantime are kept). Events missing from the dict
+    are left alone, other processes may have just created them; use
+    remove_event to delete one.
+    returns False if an edit could not be saved (e.g. the event was deleted)"""
+    if STORAGE_BACKEND == 'sqlite':
+        return sql_save_events(events)
+    
+    manifest = load_manifest()
+    saved = True
+    for event_id, event in events.items():
+        loaded = event_id in _saved_fields
+        fields = changed_fields(event)
+        if loaded and not fields:
+            continue  # unchanged (bookings etc. are saved by their own journal records)
+        if event_id not in manifest:
+            if loaded:
+                saved = False  # deleted by another process since it was loaded
+                continue
+            save_event_file(event_id, event)
+            append_manifest({'op': 'add', 'event_id': event_id, 'file': event_file_name(event_id)})
+            append_manifest(event_summary(event))
+            continue
+        
+        if not append_journal({'op': 'update', 'event_id': event_id, 'fields': fields}):
+            saved = False
+    return saved
+
+def remove_event(event_id):
+    """Delete one event with its bookings, applications and waitlist"""
+    if STORAGE_BACKEND == 'sqlite':
+        db = get_db()
+        with db:
+            sql_delete_event(db, event_id)
+        for name in ('events', 'bookings'):
+            _sql_cache.pop(name, None)
+        _saved_fields.pop(event_id, None)
+        return
+    
+    entry = load_manifest().get(event_id)
+    if entry is None:
+        return
+    append_manifest({'op': 'remove', 'event_id': event_id})
+    delete_event_file(entry['file'])
+    _saved_fields.pop(event_id, None)
+    index_event(event_id, None)
 
 def load_bookings():
-    """Load user bookings from file"""
+    """Get username -> list of tickets (built from the event bookings)"""
+    if STORAGE_BACKEND == 'sqlite':
+        return sql_load_bookings()
+    return {username: [booking for seats in events.values() for booking in seats.values()]
+            for username, events in booking_index()['users'].items()}
+
+# ============= EVENT FILES ===============
+# Every event is stored in its own file in EVENTS_DIR, and MANIFEST_FILE
+# maps event ids to file names. Booking seat 1A in event1 therefore
+# never touches the files of the other events.
+# The manifest also keeps a summary of every event (see event_summary) so
+# the listing screens never have to load seat maps. Summary updates and
+# added/removed events are appended to MANIFEST_JOURNAL and folded in like
+# the booking journal.
+
+def load_manifest():
+    """Load the manifest (event id -> file name and summary fields)"""
+    return manifest_snapshot()[0]
+
+def manifest_snapshot():
+    """Get (manifest, generation of its journal) with the journal replayed"""
+    data = load_json_cached(MANIFEST_FILE)
+    if 'journal_generation' in data or isinstance(data.get('journal_offset'), int):
+        manifest, generation = data['events'], data.get('journal_generation', 0)
+        start = data.get('journal_offset', 0)  # written before journals were rotated
+    else:
+        manifest, generation, start = data, 0, 0  # written before the journal was kept whole
+    replay_journal(manifest, journal_file(MANIFEST_JOURNAL, generation), apply_summary_record, start)
+    return manifest, generation
+
+def save_manifest(manifest, generation):
+    """Write the manifest as the snapshot of a journal generation (see compact_journal)"""
+    journal_path = start_journal(MANIFEST_JOURNAL, generation)
+    save_json_cached(MANIFEST_FILE, {'journal_generation': generation, 'events': manifest})
+    _journal_state[journal_path] = {'target': manifest, 'offset': 0, 'count': 0}
+
+def compact_manifest(generation):
+    """Fold the manifest journal into MANIFEST_FILE and start the next journal"""
+    compact_journal(MANIFEST_FILE, MANIFEST_JOURNAL, generation, load_manifest, save_manifest)
+
+def apply_summary_record(manifest, record):
+    """Apply one manifest journal record (an added/removed event, a summary
+    or a waitlist offer made/withdrawn)
+    a summary older than the one already there (written late by a process that
+    lost a race) is skipped"""
+    op = record.get('op')
+    if op == 'add':
+        manifest.setdefault(record['event_id'], {'file': record['file'], 'offers': []})
+    elif op == 'remove':
+        manifest.pop(record['event_id'], None)
+    elif op in ('offer', 'leave', 'offers'):
+        apply_offer_record(manifest, record)
+        return
+    elif record['event_id'] in manifest:
+        entry = manifest[record['event_id']]
+        if record.get('version', 0) >= entry.get('version', 0):
+            entry.update(record)
+    if 'event_id' in record:
+        _changed_events.add(record['event_id'])  # see refresh_indexes
+
+def append_manifest(record):
+    """Append a record to the manifest journal"""
+    for _ in range(SAVE_RETRIES):
+        _, generation = manifest_snapshot()
+        if write_journal(MANIFEST_FILE, journal_file(MANIFEST_JOURNAL, generation), generation, record):
+            break
+        compact_manifest(generation)  # sealed before our record, finish the rotation and go again
+    
+    _, generation = manifest_snapshot()
+    if _journal_state[journal_file(MANIFEST_JOURNAL, generation)]['count'] >= JOURNAL_COMPACT_EVERY:
+        compact_manifest(generation)
+
+def update_event_summary(event):
+    """Record the new summary of an event after a journaled change"""
+    append_manifest(event_summary(event))
+
+def event_file_name(event_id):
+    """Get a safe file name for an event id (ids may contain spaces/dots)"""
+    safe = re.sub(r'[^A-Za-z0-9_-]', '_', event_id)
+    if safe != event_id:
+        # keep names unique, e.g. "event 4." and "event_4_"
+        safe += "-" + hashlib.sha1(event_id.encode()).hexdigest()[:8]
+    return safe + ".json"
+
+def event_paths(event_id):
+    """Get (event file, journal file of generation 0) paths of an event"""
+    entry = load_manifest().get(event_id)  # file names never change
+    name = entry['file'] if entry else event_file_name(event_id)
+    path = os.path.join(EVENTS_DIR, name)
+    return path, path[:-len(".json")] + ".journal"
+
+def load_event_file(event_id):
+    """Load one event file and replay its journal"""
+    path, journal_base = event_paths(event_id)
+    event = load_json_cached(path)
+    if not event:
+        return None
+    
+    journal_path = journal_file(journal_base, event.get('journal_generation', 0))
+    if _journal_state.get(journal_path, {}).get('target') is not event:
+        # freshly read from disk, remember it to spot changes on save
+        upgrade_seat_map(event)
+        upgrade_vendor_counts(event)
+        upgrade_stall_map(event)
+        attach_legacy_tickets(event)
+        remember_fields(event)
+        index_event(event_id, event)
+    # files written before journals were rotated hold the journal up to journal_offset
+    replay_journal(event, journal_path, apply_journal_record, event.get('journal_offset', 0))
+    return event
+
+def save_event_file(event_id, event, generation=0):
+    """Write one event file as the snapshot of a journal generation
+    (new events start at 0, compact_event moves on to the next one)"""
+    path, journal_base = event_paths(event_id)
+    upgrade_seat_map(event)  # old list of lists seat maps are written packed
+    upgrade_vendor_counts(event)
+    upgrade_stall_map(event)
+    attach_legacy_tickets(event)
+    event['journal_generation'] = generation
+    event.pop('journal_offset', None)
+    journal_path = start_journal(journal_base, generation)
+    save_json_cached(path, event)
+    _journal_state[journal_path] = {'target': event, 'offset': 0, 'count': 0}
+    remember_fields(event)
+    index_event(event_id, event)
+
+def compact_event(event_id, generation):
+    """Fold an event's journal into its file and start the next journal"""
+    path, journal_base = event_paths(event_id)
+    compact_journal(path, journal_base, generation, lambda: load_event_file(event_id),
+                    lambda event, new_generation: save_event_file(event_id, event, new_generation))
+
+# fields an admin can edit, saved with 'update' records
+EVENT_FIELDS = ('name', 'date', 'location', 'price', 'total_vendor_slots', 'description')
+_saved_fields = {}  # event_id -> EVENT_FIELDS values as last loaded/saved
+
+def remember_fields(event):
+    """Keep the editable fields of an event to spot edits on save"""
+    _saved_fields[event['event_id']] = {field: event.get(field) for field in EVENT_FIELDS}
+
+def changed_fields(event):
+    """Get the editable fields that changed since the event was loaded"""
+    saved = _saved_fields.get(event['event_id'], {})
+    return {field: event.get(field) for field in EVENT_FIELDS if event.get(field) != saved.get(field)}
+
+def delete_event_file(file_name):
+    """Delete an event file, its journals and its waitlist files"""
+    path = os.path.join(EVENTS_DIR, file_name)
+    base = path[:-len(".json")]
+    # file names have no dots of their own, so this is just this event's files
+    for p in [path] + glob.glob(glob.escape(base) + ".*"):
+        if os.path.exists(p):
+            os.remove(p)
+        invalidate_cache(p)
+        _journal_state.pop(p, None)
+
+# ============= BOOKING JOURNAL ===============
+# Seat bookings/cancellations, vendor application changes and event edits
+# are appended to the event's journal file as one JSON line each instead of
+# rewriting the event file. Loading an event replays its journal on top of
+# the file, and after JOURNAL_COMPACT_EVERY records the event file is rewritten.
+# The event file is rewritten by compact_event, which seals the journal and
+# starts the next one, see compact_journal.
+# Every event has a version number that each applied record bumps by one.
+# A record claims the version it will create; if another process appended
+# a record for that version first, ours is skipped by everyone replaying the
+# journal, and append_journal checks it against the new state and retries.
+# So only the event that changed is retried, and no lock is ever taken.
+
+# journal path -> {'target': dict replayed into, 'offset': bytes replayed, 'count': records,
+#                  'sealed': True once the seal line was reached}
+_journal_state = {}
+
+SEAL_LINE = json.dumps({'op': 'seal'}).encode() + b"\n"  # ends a journal that was compacted
+
+RECENT_CHANGES = 64  # record ids kept per event to tell whether ours was applied
+
+def replay_journal(target, journal_path, apply, start=0):
+    """Apply journal records that haven't been applied to target yet
+    start is where to begin for a fresh copy of the file"""
+    state = _journal_state.get(journal_path)
+    if state is None or state['target'] is not target:
+        # fresh copy of the file -> replay the journal from where it ends
+        state = _journal_state[journal_path] = {'target': target, 'offset': start, 'count': 0}
+    if state.get('sealed'):
+        return  # the records after the seal are appended to the next journal
+    
     try:
-        with open(BOOKINGS_FILE, 'r') as f:
-            return json.load(f)
+        with open(journal_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < state['offset']:
+                # journal was deleted and started again
+                state.update(offset=0, count=0)
+            f.seek(state['offset'])
+            data = f.read()
     except FileNotFoundError:
-        return {}
+        return
+    
+    end = data.rfind(b"\n") + 1  # ignore a partly written last line
+    for line in data[:end].splitlines(keepends=True):
+        if line == SEAL_LINE:
+            state['sealed'] = True
+            break
+        state['offset'] += len(line)
+        if line.strip():
+            apply(target, json.loads(line))
+            state['count'] += 1
+
+def journal_file(path, generation):
+    """Get the journal file of a generation (generation 0 is path itself)"""
+    return f"{path}.{generation}" if generation else path
+
+def start_journal(path, generation):
+    """Create the empty journal file of a new generation, returns its path"""
+    journal_path = journal_file(path, generation)
+    open(journal_path, 'w').close()
+    _journal_state.pop(journal_path, None)
+    return journal_path
+
+def write_journal(snapshot_path, journal_path, generation, record):
+    """Append a record to the journal of a generation and fsync it
+    returns False if it didn't make it into that generation: the journal was
+    sealed before it, or already rotated away (the caller then finishes the
+    compaction and appends it to the next journal)"""
+    line = json.dumps(record).encode() + b"\n"
+    fd = os.open(journal_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'r+b') as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+        end = f.tell()
+        f.seek(0)
+        data = f.read()
+    
+    seal = (b"\n" + data).find(b"\n" + SEAL_LINE)
+    if seal != -1:
+        return seal >= end  # only counts if the seal came after it
+    # no seal yet: fine unless the snapshot moved on and this was a leftover file
+    return load_json_cached(snapshot_path).get('journal_generation', 0) == generation
+
+def compact_journal(snapshot_path, journal_path, generation, load, save):
+    """Fold a journal into its snapshot and move on to the next journal file
+    Only one process rotates a file at a time (a lock file next to it). The
+    journal is sealed, replayed up to the seal and the snapshot saved as the
+    next generation with an empty journal; records appended after the seal
+    don't count and their writers append them again to the new journal. The
+    old journal is deleted once the snapshot is on disk.
+    load() gets the replayed state, save(state, generation) writes the snapshot"""
+    with open(snapshot_path + ".lock", 'a') as lock:
+        while not lock_file(lock, wait=True):
+            pass  # msvcrt gives up after 10 seconds
+        try:
+            if load_json_cached(snapshot_path).get('journal_generation', 0) != generation:
+                return  # another process got there first
+            
+            old_path = journal_file(journal_path, generation)
+            if load() is None:
+                return  # deleted
+            if not _journal_state.get(old_path, {}).get('sealed'):
+                with open(old_path, 'ab') as f:
+                    f.write(SEAL_LINE)
+                    f.flush()
+                    os.fsync(f.fileno())
+            save(load(), generation + 1)
+            sync_dir(os.path.dirname(snapshot_path))
+            
+            # also a file a late writer recreated after the last rotation
+            for old in {old_path, journal_file(journal_path, max(generation - 1, 0))}:
+                if os.path.exists(old):
+                    os.remove(old)
+                _journal_state.pop(old, None)
+        finally:
+            unlock_file(lock)
+
+def sync_dir(path):
+    """Make renames in a directory durable (not needed/possible on Windows)"""
+    if os.name != 'nt':
+        fd = os.open(path or ".", os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def can_apply(event, record):
+    """Check that a change record still fits the event as it is now"""
+    op = record['op']
+    if op == 'book':
+        # all seats of a group booking or none of them
+        return all(event['seats'].is_available(row, seat) for row, seat in record_seats(record))
+    if op == 'cancel' and record.get('ticket_id'):
+        # a user cancelling a ticket: only if the seat is still that ticket
+        info = event['bookings'].get(seat_label(*record_seats(record)[0]))
+        return bool(info) and info.get('ticket_id') == record['ticket_id']
+    if op in ('vendor_status', 'vendor_batch'):
+        vendors = record_vendors(record)
+        if not all(vendor in event['vendor_bookings'] for vendor in vendors):
+            return False
+        # approvals must fit in the stalls that are left (and picked stalls be free)
+        if record['status'] != 'approved':
+            return True
+        picked = [tuple(position) for position in record.get('stalls', {}).values()]
+        return (approval_fits(event, vendors) and len(set(picked)) == len(picked)
+                and all(stall_fits(event, position) for position in picked))
+    if op == 'refund':
+        return record['ticket_id'] in event.get('refunds', {})
+    return op in ('cancel', 'vendor_apply', 'update')
+
+def apply_journal_record(event, record):
+    """Apply one journal record to an event
+    a record that claims a version only applies on top of the version before it"""
+    if 'version' in record and record['version'] != event.get('version', 0) + 1:
+        return False
+    if not can_apply(event, record):
+        return False
+    
+    op = record['op']
+    if op == 'book':
+        seats = record_seats(record)
+        tickets = record.get('tickets') or [None] * len(seats)
+        for (row, seat), ticket_id in zip(seats, tickets):
+            event['seats'].book(row, seat)
+            info = {"user": record['user'], "time": record['time']}
+            if ticket_id:
+                info['ticket_id'] = ticket_id
+            if record.get('group_id'):
+                info['group_id'] = record['group_id']
+            if 'price' in record:
+                info['price'] = record['price']  # what was paid for the seat, refunded on cancel
+            event['bookings'][seat_label(row, seat)] = info
+            index_booking(event, seat_label(row, seat), info)
+    elif op == 'cancel':
+        seats = record_seats(record)
+        for row, seat in seats:
+            event['seats'].cancel(row, seat)
+            event['bookings'].pop(seat_label(row, seat), None)
+            unindex_booking(event['event_id'], seat_label(row, seat))
+        if record.get('refund'):
+            event.setdefault('refunds', {})[record['ticket_id']] = dict(
+                record['refund'], user=record['user'], seat=seat_label(*seats[0]), time=record['time'])
+    elif op == 'vendor_apply':
+        old = event['vendor_bookings'].get(record['vendor'])
+        if old:
+            count_vendor_status(event, old['status'], -1)
+            release_stall(event, record['vendor'])
+        event['vendor_bookings'][record['vendor']] = record['application']
+        count_vendor_status(event, record['application']['status'], 1)
+        index_application(event, record['vendor'], record['application'])
+    elif op in ('vendor_status', 'vendor_batch'):
+        for vendor in record_vendors(record):
+            app = event['vendor_bookings'][vendor]
+            count_vendor_status(event, app['status'], -1)
+            if record['status'] != 'approved':
+                release_stall(event, vendor)
+            elif app['status'] != 'approved':
+                position = record.get('stalls', {}).get(vendor)
+                assign_stall(event, vendor, tuple(position) if position else None)
+            app['status'] = record['status']
+            count_vendor_status(event, app['status'], 1)
+            if record.get('message'):
+                app['message'] = record['message']
+            index_application(event, vendor, app)
+    elif op == 'refund':
+        event['refunds'][record['ticket_id']]['refund_id'] = record['refund_id']
+    elif op == 'update':
+        event.update(record['fields'])
+        _saved_fields.setdefault(event['event_id'], {}).update(record['fields'])
+        if 'total_vendor_slots' in record['fields']:
+            layout_stalls(event)
+        index_event(event['event_id'], event)  # the indexes show the event name and date
+    
+    event['version'] = event.get('version', 0) + 1
+    if record.get('rid'):
+        recent = event.setdefault('recent_changes', [])
+        recent.append(record['rid'])
+        del recent[:-RECENT_CHANGES]
+    return True
+
+def record_vendors(record):
+    """Get the vendors of a vendor_status (one vendor) or vendor_batch record"""
+    if 'vendors' in record:
+        return record['vendors']
+    return [record['vendor']]
 
-def save_bookings(bookings):
-    """Save user bookings to file"""
-    with open(BOOKINGS_FILE, 'w') as f:
-        json.dump(bookings, f, indent=2)
+def record_seats(record):
+    """Get the [row, seat] pairs of a book/cancel record
+    (older records have a single row/seat instead of a seats list)"""
+    if 'seats' in record:
+        return record['seats']
+    return [[record['row'], record['seat']]]
+
+def append_journal(record):
+    """Append a change record to the event's journal and fsync it to disk
+    returns False if the change no longer fits (e.g. the seat was taken)"""
+    if STORAGE_BACKEND == 'sqlite':
+        # the database is transactional, so the record is applied directly
+        return sql_apply_record(record)
+    
+    event_id = record['event_id']
+    path, journal_base = event_paths(event_id)
+    record = dict(record, rid=new_id("REC"))
+    for _ in range(SAVE_RETRIES):
+        event = load_event_file(event_id)
+        if not event or not can_apply(event, record):
+            return False
+        generation = event.get('journal_generation', 0)
+        record['version'] = event.get('version', 0) + 1
+        if not write_journal(path, journal_file(journal_base, generation), generation, record):
+            compact_event(event_id, generation)  # sealed before our record
+            continue
+        
+        # replaying picks up our record along with anything other processes
+        # appended before it; if one of them took our version, check again
+        event = load_event_file(event_id)
+        if event and record['rid'] in event.get('recent_changes', []):
+            update_event_summary(event)
+            generation = event.get('journal_generation', 0)
+            if _journal_state[journal_file(journal_base, generation)]['count'] >= JOURNAL_COMPACT_EVERY:
+                compact_event(event_id, generation)
+            return True
+    return False
+
+# ============= SQLITE BACKEND ===============
+# Used when STORAGE_BACKEND is "sqlite". Each record type lives in its own
+# table, so flows can run indexed queries instead of parsing whole files.
+# Loaded dicts are cached until another connection changes the database
+# (PRAGMA data_version), and saves only rewrite the rows that changed.
+
+DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
+
+CREATE TABLE IF NOT EXISTS events (
+    event_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    location TEXT NOT NULL,
+    price REAL NOT NULL,
+    rows INTEGER NOT NULL,
+    seats_per_row INTEGER NOT NULL,
+    total_vendor_slots INTEGER NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS seats (
+    event_id TEXT NOT NULL,
+    row_idx INTEGER NOT NULL,
+    seat_idx INTEGER NOT NULL,
+    available INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (event_id, row_idx, seat_idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_seats_available ON seats(event_id, available);
+
+CREATE TABLE IF NOT EXISTS seat_bookings (
+    event_id TEXT NOT NULL,
+    seat_label TEXT NOT NULL,
+    username TEXT NOT NULL,
+    time TEXT NOT NULL,
+    ticket_id TEXT,
+    group_id TEXT,
+    price REAL,
+    PRIMARY KEY (event_id, seat_label)
+);
+DROP INDEX IF EXISTS idx_seat_bookings_user;
+CREATE INDEX IF NOT EXISTS idx_seat_bookings_user_event ON seat_bookings(username, event_id);
+
+CREATE TABLE IF NOT EXISTS vendor_applications (
+    event_id TEXT NOT NULL,
+    vendor TEXT NOT NULL,
+    status TEXT NOT NULL,
+    time TEXT NOT NULL,
+    business_name TEXT NOT NULL DEFAULT '',
+    business_type TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    message TEXT,
+    stall TEXT,
+    PRIMARY KEY (event_id, vendor)
+);
+CREATE INDEX IF NOT EXISTS idx_vendor_apps_status ON vendor_applications(status, event_id);
+CREATE INDEX IF NOT EXISTS idx_vendor_apps_queue ON vendor_applications(status, time);
+CREATE INDEX IF NOT EXISTS idx_vendor_apps_vendor ON vendor_applications(vendor);
+
+CREATE TABLE IF NOT EXISTS refunds (
+    ticket_id TEXT PRIMARY KEY,
+    event_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    seat TEXT NOT NULL,
+    amount REAL NOT NULL,
+    refund_id TEXT NOT NULL,
+    time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_refunds_event ON refunds(event_id);
+
+CREATE TABLE IF NOT EXISTS waitlist (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    time TEXT NOT NULL,
+    offer_row INTEGER,
+    offer_seat INTEGER,
+    offer_expires REAL,
+    UNIQUE (event_id, username)
+);
+CREATE INDEX IF NOT EXISTS idx_waitlist_queue ON waitlist(event_id, offer_expires, priority, id);
+CREATE INDEX IF NOT EXISTS idx_waitlist_user ON waitlist(username);
+
+CREATE TABLE IF NOT EXISTS checkins (
+    ticket_id TEXT PRIMARY KEY,
+    event_id TEXT NOT NULL,
+    time TEXT NOT NULL,
+    cancelled INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+class BookingConflict(Exception):
+    """A change no longer fits by the time it is saved
+    (a seat was taken, or there are no stalls left for an approval)"""
+
+_db = None
+_sql_cache = {}  # 'users' / 'events' / 'bookings' -> loaded dict, plus 'version'
+
+def get_db():
+    """Open the database (once) and make sure the tables exist"""
+    global _db
+    if _db is None:
+        _db = sqlite3.connect(DB_FILE)
+        _db.row_factory = sqlite3.Row
+        _db.executescript(DB_SCHEMA)
+        upgrade_db(_db)
+    return _db
+
+def upgrade_db(db):
+    """Bring a database created by an older version up to the current schema"""
+    columns = [r['name'] for r in db.execute("PRAGMA table_info(seat_bookings)")]
+    if 'ticket_id' not in columns:
+        with db:
+            db.execute("ALTER TABLE seat_bookings ADD COLUMN ticket_id TEXT")
+            db.execute("ALTER TABLE seat_bookings ADD COLUMN group_id TEXT")
+    
+    old_columns = [r['name'] for r in db.execute("PRAGMA table_info(user_bookings)")]
+    if old_columns:
+        # ticket ids used to be kept in a second table, user_bookings
+        group_id = "u.group_id" if 'group_id' in old_columns else "NULL"
+        with db:
+            db.execute(f"UPDATE seat_bookings SET (ticket_id, group_id) = "
+                       f"(SELECT u.ticket_id, {group_id} FROM user_bookings u "
+                       f"WHERE u.event_id = seat_bookings.event_id AND u.seat = seat_bookings.seat_label "
+                       f"AND u.username = seat_bookings.username) WHERE ticket_id IS NULL")
+            db.execute("DROP TABLE user_bookings")
+    
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_seat_bookings_ticket ON seat_bookings(ticket_id)")
+    
+    if 'version' not in [r['name'] for r in db.execute("PRAGMA table_info(events)")]:
+        with db:
+            db.execute("ALTER TABLE events ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    
+    if 'stall' not in [r['name'] for r in db.execute("PRAGMA table_info(vendor_applications)")]:
+        # approved vendors get their stalls placed once
+        with db:
+            db.execute("ALTER TABLE vendor_applications ADD COLUMN stall TEXT")
+            for (event_id,) in db.execute("SELECT DISTINCT event_id FROM vendor_applications "
+                                          "WHERE status = 'approved'").fetchall():
+                sql_save_stalls(db, sql_read_events(event_id, db)[event_id])
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_vendor_apps_stall ON vendor_applications(event_id, stall) "
+               "WHERE stall IS NOT NULL")
+    
+    if 'cancelled' not in [r['name'] for r in db.execute("PRAGMA table_info(checkins)")]:
+        with db:
+            db.execute("ALTER TABLE checkins ADD COLUMN cancelled INTEGER NOT NULL DEFAULT 0")
+    
+    if 'price' not in [r['name'] for r in db.execute("PRAGMA table_info(seat_bookings)")]:
+        with db:
+            db.execute("ALTER TABLE seat_bookings ADD COLUMN price REAL")
+
+def initialize_db():
+    """Create the database, importing the JSON files the first time"""
+    db = get_db()
+    if db.execute("SELECT COUNT(*) FROM users").fetchone()[0]:
+        return
+    
+    if os.path.exists(USERS_FILE) or os.path.exists(MANIFEST_FILE) or os.path.exists(EVENTS_FILE):
+        import_json_to_sqlite()
+    else:
+        with db:
+            db.execute("INSERT INTO users VALUES (?, ?, ?, ?)",
+                       ('admin', 'admin123', 'admin', 'Administrator'))
+
+def sql_cached(name, loader):
+    """Return a cached table dict, reloading it if the database changed"""
+    version = get_db().execute("PRAGMA data_version").fetchone()[0]
+    if _sql_cache.get('version') != version:
+        # another process wrote to the database
+        _sql_cache.clear()
+        _sql_cache['version'] = version
+    
+    if name in _sql_cache:
+        cache_stats['hits'] += 1
+        return _sql_cache[name]
+    
+    cache_stats['misses'] += 1
+    data = loader()
+    _sql_cache[name] = data
+    if name in _saved_json:
+        _saved_json[name] = {key: fingerprint(value) for key, value in data.items()}
+    return data
+
+def sql_load_users():
+    """Load users from the database"""
+    def loader():
+        users = {}
+        for r in get_db().execute("SELECT * FROM users"):
+            users[r['username']] = {'password': r['password'], 'role': r['role'], 'name': r['name']}
+        return users
+    return sql_cached('users', loader)
+
+def sql_save_users(users):
+    """Write changed/removed users to the database"""
+    changed, removed = changed_keys('users', users)
+    db = get_db()
+    with db:
+        db.executemany("DELETE FROM users WHERE username = ?", [(u,) for u in removed])
+        db.executemany("INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?)",
+                       [(u, users[u]['password'], users[u]['role'], users[u]['name']) for u in changed])
+    _sql_cache['users'] = users
+
+def sql_read_events(event_id=None, db=None):
+    """Build event dicts from the tables (all events, or just one)"""
+    db = db or get_db()
+    where, params = "", ()
+    if event_id is not None:
+        where, params = "WHERE event_id = ?", (event_id,)
+    
+    events = {}
+    for r in db.execute(f"SELECT * FROM events {where}", params):
+        events[r['event_id']] = {
+            'event_id': r['event_id'],
+            'name': r['name'],
+            'date': r['date'],
+            'location': r['location'],
+            'price': r['price'],
+            'rows': r['rows'],
+            'seats_per_row': r['seats_per_row'],
+            'seats': create_seat_map(r['rows'], r['seats_per_row']),
+            'bookings': {},
+            'total_vendor_slots': r['total_vendor_slots'],
+            'vendor_bookings': {},
+            'refunds': {},
+            'vendor_counts': dict.fromkeys(VENDOR_STATUSES, 0),
+            'stall_bookings': {},
+            'description': r['description'],
+            'version': r['version']
+        }
+        remember_fields(events[r['event_id']])
+    
+    # only booked seats are read, the rest stay True
+    booked_where = "WHERE available = 0" + (" AND event_id = ?" if where else "")
+    for r in db.execute(f"SELECT event_id, row_idx, seat_idx FROM seats {booked_where}", params):
+        events[r['event_id']]['seats'].book(r['row_idx'], r['seat_idx'])
+    for r in db.execute(f"SELECT * FROM seat_bookings {where}", params):
+        info = {'user': r['username'], 'time': r['time']}
+        if r['ticket_id']:
+            info['ticket_id'] = r['ticket_id']
+        if r['group_id']:
+            info['group_id'] = r['group_id']
+        if r['price'] is not None:
+            info['price'] = r['price']
+        events[r['event_id']]['bookings'][r['seat_label']] = info
+    for r in db.execute(f"SELECT * FROM vendor_applications {where}", params):
+        app = {
+            'status': r['status'],
+            'time': r['time'],
+            'business_name': r['business_name'],
+            'business_type': r['business_type'],
+            'description': r['description']
+        }
+        if r['message'] is not None:
+            app['message'] = r['message']
+        if r['stall'] is not None:
+            app['stall'] = r['stall']
+            events[r['event_id']]['stall_bookings'][r['stall']] = r['vendor']
+        events[r['event_id']]['vendor_bookings'][r['vendor']] = app
+        count_vendor_status(events[r['event_id']], app['status'], 1)
+    for r in db.execute(f"SELECT * FROM refunds {where}", params):
+        events[r['event_id']]['refunds'][r['ticket_id']] = {
+            'amount': r['amount'], 'refund_id': r['refund_id'],
+            'user': r['username'], 'seat': r['seat'], 'time': r['time']}
+    for event in events.values():
+        layout_stalls(event)
+    return events
+
+def sql_load_events():
+    """Load all events from the database"""
+    return sql_cached('events', sql_read_events)
+
+def sql_write_event(db, event):
+    """Replace every row that belongs to one event"""
+    event_id = event['event_id']
+    sql_delete_event(db, event_id)
+    db.execute("INSERT INTO events (event_id, name, date, location, price, rows, seats_per_row, "
+               "total_vendor_slots, description, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+               (event_id, event['name'], event['date'], event['location'], event['price'],
+                event['rows'], event['seats_per_row'], event['total_vendor_slots'],
+                event.get('description', ''), event.get('version', 0)))
+    db.executemany("INSERT INTO seats VALUES (?, ?, ?, ?)",
+                   [(event_id, r, c, int(available))
+                    for r, row in enumerate(event['seats'])
+                    for c, available in enumerate(row)])
+    db.executemany("INSERT INTO seat_bookings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                   [(event_id, label, info['user'], info['time'], info.get('ticket_id'), info.get('group_id'),
+                     info.get('price'))
+                    for label, info in event['bookings'].items()])
+    db.executemany("INSERT INTO vendor_applications (event_id, vendor, status, time, business_name, "
+                   "business_type, description, message, stall) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                   [(event_id, vendor, app['status'], app['time'], app.get('business_name', ''),
+                     app.get('business_type', ''), app.get('description', ''), app.get('message'),
+                     app.get('stall'))
+                    for vendor, app in event['vendor_bookings'].items()])
+    db.executemany("INSERT INTO refunds VALUES (?, ?, ?, ?, ?, ?, ?)",
+                   [(ticket_id, event_id, r['user'], r['seat'], r['amount'], r['refund_id'], r['time'])
+                    for ticket_id, r in event.get('refunds', {}).items()])
+
+def sql_save_stalls(db, event):
+    """Write the stall of every application of an event"""
+    db.execute("UPDATE vendor_applications SET stall = NULL WHERE event_id = ?", (event['event_id'],))
+    db.executemany("UPDATE vendor_applications SET stall = ? WHERE event_id = ? AND vendor = ?",
+                   [(app['stall'], event['event_id'], vendor)
+                    for vendor, app in event['vendor_bookings'].items() if app.get('stall')])
+
+def sql_delete_event(db, event_id):
+    """Delete an event and its seats/bookings/applications/refunds/waitlist"""
+    for table in ('events', 'seats', 'seat_bookings', 'vendor_applications', 'refunds', 'waitlist'):
+        db.execute(f"DELETE FROM {table} WHERE event_id = ?", (event_id,))
+
+def sql_save_events(events):
+    """Write only the events that changed
+    new events are written whole; for existing ones only the edited fields
+    are saved (seats and bookings change through sql_apply_record), with a
+    compare and swap on the event's version
+    returns False if an edit could not be saved"""
+    saved = True
+    written = {}
+    db = get_db()
+    with db:
+        for event_id, event in events.items():
+            loaded = event_id in _saved_fields
+            fields = changed_fields(event)
+            if loaded and not fields:
+                continue
+            if not db.execute("SELECT 1 FROM events WHERE event_id = ?", (event_id,)).fetchone():
+                if loaded:
+                    saved = False  # deleted by another process since it was loaded
+                    continue
+                sql_write_event(db, event)
+                remember_fields(event)
+                written[event_id] = event
+                continue
+            
+            assignments = ", ".join(f"{field} = ?" for field in fields)
+            for _ in range(SAVE_RETRIES):
+                cur = db.execute(f"UPDATE events SET {assignments}, version = version + 1 "
+                                 f"WHERE event_id = ? AND version = ?",
+                                 (*fields.values(), event_id, event.get('version', 0)))
+                if cur.rowcount:
+                    event['version'] = event.get('version', 0) + 1
+                    remember_fields(event)
+                    if 'total_vendor_slots' in fields:
+                        layout_stalls(event)
+                        sql_save_stalls(db, event)
+                    written[event_id] = event
+                    break
+                # changed by another process since it was loaded -> merge our edits into its copy
+                event = sql_read_events(event_id).get(event_id)
+                if event is None:
+                    saved = False  # deleted in the meantime
+                    break
+                event.update(fields)
+                events[event_id] = event
+            else:
+                saved = False
+    cached = _sql_cache.get('events')
+    if cached is not None:
+        cached.update(written)  # our own writes don't make the cache look stale
+    return saved
+
+def sql_load_bookings():
+    """Load user bookings (username -> list of tickets) from the database"""
+    def loader():
+        bookings = {}
+        for r in get_db().execute("SELECT * FROM seat_bookings WHERE ticket_id IS NOT NULL "
+                                  "ORDER BY time, rowid"):
+            bookings.setdefault(r['username'], []).append(sql_user_booking(r))
+        return bookings
+    return sql_cached('bookings', loader)
+
+def sql_user_booking(r):
+    """The per-user view (see user_booking) of a seat_bookings row"""
+    return user_booking(r['event_id'], r['seat_label'], {
+        'ticket_id': r['ticket_id'], 'time': r['time'], 'group_id': r['group_id']})
+
+def sql_apply_record(record):
+    """Apply one journal style change record as a single transaction
+    returns False if a booking conflicted (nothing is changed then)"""
+    db = get_db()
+    event_id = record['event_id']
+    op = record['op']
+    try:
+        with db:
+            sql_apply_changes(db, event_id, op, record)
+    except BookingConflict:
+        return False
+    
+    # keep the cached copies in step with the database
+    _sql_cache.pop('bookings', None)
+    events = _sql_cache.get('events')
+    if events is not None and event_id in events:
+        apply_journal_record(events[event_id], record)
+    return True
+
+def sql_apply_changes(db, event_id, op, record):
+    """Run the statements of one change record (inside a transaction)"""
+    # written first so the transaction holds the write lock for what it reads
+    if not db.execute("UPDATE events SET version = version + 1 WHERE event_id = ?", (event_id,)).rowcount:
+        raise BookingConflict(event_id)  # no such event (deleted), nothing may be written for it
+    if op == 'book':
+        for row, seat in record_seats(record):
+            cur = db.execute("UPDATE seats SET available = 0 WHERE event_id = ? AND row_idx = ? "
+                             "AND seat_idx = ? AND available = 1", (event_id, row, seat))
+            if not cur.rowcount:
+                raise BookingConflict(seat_label(row, seat))  # rolls back the whole group
+        tickets = record.get('tickets') or [None] * len(record_seats(record))
+        for (row, seat), ticket_id in zip(record_seats(record), tickets):
+            try:
+                db.execute("INSERT INTO seat_bookings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (event_id, seat_label(row, seat), record['user'], record['time'],
+                            ticket_id, record.get('group_id'), record.get('price')))
+            except sqlite3.IntegrityError:
+                # a ticket id or booking that already exists is never overwritten
+                raise BookingConflict(seat_label(row, seat))
+    elif op == 'cancel':
+        for row, seat in record_seats(record):
+            if record.get('ticket_id'):
+                cur = db.execute("DELETE FROM seat_bookings WHERE event_id = ? AND seat_label = ? "
+                                 "AND ticket_id = ?", (event_id, seat_label(row, seat), record['ticket_id']))
+                if not cur.rowcount:
+                    raise BookingConflict(seat_label(row, seat))  # already cancelled
+            else:
+                db.execute("DELETE FROM seat_bookings WHERE event_id = ? AND seat_label = ?",
+                           (event_id, seat_label(row, seat)))
+            db.execute("UPDATE seats SET available = 1 WHERE event_id = ? AND row_idx = ? AND seat_idx = ?",
+                       (event_id, row, seat))
+        if record.get('refund'):
+            refund = record['refund']
+            db.execute("INSERT INTO refunds VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (record['ticket_id'], event_id, record['user'], seat_label(*record_seats(record)[0]),
+                        refund['amount'], refund['refund_id'], record['time']))
+    elif op == 'refund':
+        cur = db.execute("UPDATE refunds SET refund_id = ? WHERE ticket_id = ? AND event_id = ?",
+                         (record['refund_id'], record['ticket_id'], event_id))
+        if not cur.rowcount:
+            raise BookingConflict(record['ticket_id'])
+    elif op == 'vendor_apply':
+        app = record['application']
+        db.execute("INSERT OR REPLACE INTO vendor_applications (event_id, vendor, status, time, business_name, "
+                   "business_type, description, message) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                   (event_id, record['vendor'], app['status'], app['time'], app['business_name'],
+                    app['business_type'], app['description'], app.get('message')))
+    elif op in ('vendor_status', 'vendor_batch'):
+        # checked and applied on a fresh copy of the event, which also places the stalls
+        event = sql_read_events(event_id, db).get(event_id)
+        if event is None or not can_apply(event, record):
+            raise BookingConflict("no stalls left")  # rolls back every approval of the batch
+        newly_approved = [vendor for vendor in record_vendors(record)
+                          if event['vendor_bookings'][vendor]['status'] != 'approved']
+        apply_journal_record(event, record)
+        for vendor in record_vendors(record):
+            app = event['vendor_bookings'][vendor]
+            db.execute("UPDATE vendor_applications SET status = ?, message = ?, stall = ? "
+                       "WHERE event_id = ? AND vendor = ?",
+                       (app['status'], app.get('message'), app.get('stall'), event_id, vendor))
+        # the cached copy gets the same stalls
+        if record['status'] == 'approved':
+            record['stalls'] = {vendor: parse_seat_label(event['vendor_bookings'][vendor]['stall'])
+                                for vendor in newly_approved if event['vendor_bookings'][vendor].get('stall')}
+    elif op == 'update':
+        fields = {field: value for field, value in record['fields'].items() if field in EVENT_FIELDS}
+        if fields:
+            db.execute(f"UPDATE events SET {', '.join(f'{field} = ?' for field in fields)} "
+                       f"WHERE event_id = ?", (*fields.values(), event_id))
+        if 'total_vendor_slots' in fields:
+            sql_save_stalls(db, sql_read_events(event_id, db)[event_id])
+
+def import_json_to_sqlite():
+    """One-shot import of the JSON users, events and bookings into DB_FILE"""
+    users = load_json_cached(USERS_FILE)
+    if os.path.exists(MANIFEST_FILE):
+        events = {event_id: load_event_file(event_id) for event_id in load_manifest()}
+    else:
+        events = load_json_cached(EVENTS_FILE)
+        for event in events.values():
+            attach_legacy_tickets(event)
+            upgrade_stall_map(event)
+    
+    db = get_db()
+    with db:
+        for table in ('users', 'events', 'seats', 'seat_bookings', 'vendor_applications', 'refunds'):
+            db.execute(f"DELETE FROM {table}")
+        db.executemany("INSERT INTO users VALUES (?, ?, ?, ?)",
+                       [(u, info['password'], info['role'], info['name']) for u, info in users.items()])
+        for event in events.values():
+            sql_write_event(db, event)
+    
+    _sql_cache.clear()
+    print(f"Imported {len(users)} users, {len(events)} events and "
+          f"{sum(len(e['bookings']) for e in events.values())} bookings into {DB_FILE}")
+
+# ============= STORAGE QUERIES ===============
+# Read helpers used by the menus. With the sqlite backend they run
+# indexed queries, with the JSON files they scan the loaded dicts.
+
+def load_event(event_id):
+    """Load a single event (None if it doesn't exist)"""
+    if STORAGE_BACKEND == 'sqlite':
+        return sql_read_events(event_id).get(event_id)
+    return load_event_file(event_id)
+
+def get_event_summaries():
+    """Get event id -> summary (see event_summary) without loading seat maps"""
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute(
+            "SELECT e.event_id, e.name, e.date, e.location, e.price, "
+            "e.rows * e.seats_per_row AS total_seats, "
+            "(SELECT COUNT(*) FROM seats s WHERE s.event_id = e.event_id AND s.available = 1) AS available_seats, "
+            "e.total_vendor_slots, e.total_vendor_slots - "
+            "(SELECT COUNT(*) FROM vendor_applications a WHERE a.status = 'approved' "
+            "AND a.event_id = e.event_id) AS available_vendor_slots "
+            "FROM events e ORDER BY e.rowid")
+        return {r['event_id']: dict(r) for r in rows}
+    
+    manifest = load_manifest()
+    missing = [event_id for event_id, entry in manifest.items() if 'refunds_owed' not in entry]
+    if missing:
+        # manifest written before summaries (or these fields) existed -> build them once
+        for event_id in missing:
+            update_event_summary(load_event_file(event_id))
+        manifest = load_manifest()
+    return manifest
+
+def get_user_tickets(username):
+    """Get a user's bookings with the event name and date filled in"""
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute(
+            "SELECT b.*, e.name, e.date FROM seat_bookings b JOIN events e ON e.event_id = b.event_id "
+            "WHERE b.username = ? AND b.ticket_id IS NOT NULL ORDER BY b.time, b.rowid", (username,))
+        return [dict(sql_user_booking(r), event_name=r['name'], event_date=r['date']) for r in rows]
+    
+    user_events = booking_index()['users'].get(username, {})
+    tickets = [booking for seats in user_events.values() for booking in seats.values()]
+    return sorted(tickets, key=lambda b: b['time'])
+
+def get_user_event_seats(username, event_id):
+    """Get seat label -> ticket id of a user's seats in one event"""
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute("SELECT seat_label, ticket_id FROM seat_bookings "
+                                "WHERE username = ? AND event_id = ? AND ticket_id IS NOT NULL",
+                                (username, event_id))
+        return {r['seat_label']: r['ticket_id'] for r in rows}
+    
+    load_event(event_id)  # brings this event's part of the index up to date
+    seats = _booking_index['users'].get(username, {}).get(event_id, {})
+    return {label: booking['ticket_id'] for label, booking in seats.items()}
+
+def get_vendor_applications(username):
+    """Get a vendor's stall applications with the event name and date"""
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute(
+            "SELECT a.*, e.name, e.date FROM vendor_applications a "
+            "JOIN events e ON e.event_id = a.event_id WHERE a.vendor = ? ORDER BY a.time", (username,))
+        applications = []
+        for r in rows:
+            app = {'status': r['status'], 'time': r['time'], 'business_name': r['business_name'],
+                   'business_type': r['business_type'], 'description': r['description']}
+            if r['message'] is not None:
+                app['message'] = r['message']
+            if r['stall'] is not None:
+                app['stall'] = r['stall']
+            applications.append({'event_id': r['event_id'], 'event_name': r['name'],
+                                 'event_date': r['date'], 'application': app})
+        return applications
+    
+    entries = application_index()['vendors'].get(username, {}).values()
+    return [{'event_id': entry['event_id'], 'event_name': entry['event_name'],
+             'event_date': entry['event_date'], 'application': entry['app']}
+            for entry in sorted(entries, key=lambda entry: entry['app']['time'])]
+
+def get_pending_applications(offset=0, limit=REVIEW_PAGE_SIZE):
+    """Get one page of the pending vendor applications across events, oldest first
+    returns (number of pending applications, list of applications)"""
+    if STORAGE_BACKEND == 'sqlite':
+        db = get_db()
+        total = db.execute("SELECT COUNT(*) FROM vendor_applications WHERE status = 'pending'").fetchone()[0]
+        rows = db.execute(
+            "SELECT a.*, e.name FROM vendor_applications a "
+            "JOIN events e ON e.event_id = a.event_id WHERE a.status = 'pending' "
+            "ORDER BY a.time, a.rowid LIMIT ? OFFSET ?", (limit, offset))
+        return total, [{'event_id': r['event_id'], 'event_name': r['name'], 'vendor': r['vendor'],
+                        'app': {'status': r['status'], 'time': r['time'], 'business_name': r['business_name'],
+                                'business_type': r['business_type'], 'description': r['description']}}
+                       for r in rows]
+    
+    index = application_index()
+    queue, pending = index['queue'], index['status'].get('pending', {})
+    return len(queue), [pending[(event_id, vendor)] for _, event_id, vendor in queue[offset:offset + limit]]
+
+def find_pending_applications(event_id="", business_type="", applied_before=""):
+    """Get the pending applications matching the filters (blank = any), oldest first
+    applied_before is a date/time such as 2026-01-15 or 2026-01-15 12:00:00"""
+    if STORAGE_BACKEND == 'sqlite':
+        where, params = ["a.status = 'pending'"], []
+        if event_id:
+            where.append("a.event_id = ?")
+            params.append(event_id)
+        if business_type:
+            where.append("a.business_type = ? COLLATE NOCASE")
+            params.append(business_type)
+        if applied_before:
+            where.append("a.time < ?")
+            params.append(applied_before)
+        rows = get_db().execute(
+            f"SELECT a.*, e.name FROM vendor_applications a JOIN events e ON e.event_id = a.event_id "
+            f"WHERE {' AND '.join(where)} ORDER BY a.time, a.rowid", params)
+        return [{'event_id': r['event_id'], 'event_name': r['name'], 'vendor': r['vendor'],
+                 'app': {'status': r['status'], 'time': r['time'], 'business_name': r['business_name'],
+                         'business_type': r['business_type'], 'description': r['description']}}
+                for r in rows]
+    
+    index = application_index()
+    queue, pending = index['queue'], index['status'].get('pending', {})
+    if applied_before:
+        queue = queue[:bisect.bisect_left(queue, (applied_before,))]
+    items = (pending[(app_event, vendor)] for _, app_event, vendor in queue
+             if not event_id or app_event == event_id)
+    return [item for item in items
+            if not business_type or item['app']['business_type'].lower() == business_type.lower()]
+
+def get_all_seat_bookings():
+    """Get (event name, {seat: booking info}) for every event with bookings"""
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute(
+            "SELECT b.*, e.name FROM seat_bookings b JOIN events e ON e.event_id = b.event_id "
+            "ORDER BY e.rowid, b.rowid")
+        grouped = {}
+        for r in rows:
+            name, seats = grouped.setdefault(r['event_id'], (r['name'], {}))
+            seats[r['seat_label']] = {'user': r['username'], 'time': r['time'], 'ticket_id': r['ticket_id']}
+        return list(grouped.values())
+    
+    return [(event['name'], event['bookings']) for event in load_events().values() if event['bookings']]
+
+def get_booking_stats():
+    """Get name, price, booking count and total seats of every event"""
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute(
+            "SELECT e.name, e.price, e.rows * e.seats_per_row AS total_seats, "
+            "(SELECT COUNT(*) FROM seat_bookings b WHERE b.event_id = e.event_id) AS bookings "
+            "FROM events e ORDER BY e.rowid")
+        return [dict(r) for r in rows]
+    
+    return [{'name': event['name'], 'price': event['price'], 'total_seats': get_total_seats(event),
+             'bookings': len(event['bookings'])} for event in load_events().values()]
+
+def count_users_by_role():
+    """Get the number of accounts per role"""
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute("SELECT role, COUNT(*) FROM users GROUP BY role")
+        return {role: count for role, count in rows}
+    
+    counts = {}
+    for user in load_users().values():
+        counts[user['role']] = counts.get(user['role'], 0) + 1
+    return counts
 
 # ============= SEAT MAP FUNCTIONS ===============
 
+class SeatMap:
+    """Seat availability packed into bits (1 = available, 0 = occupied)
+    every row starts on a new byte, so a 50k seat venue takes ~6KB
+    instead of a list of lists of booleans"""
+    
+    def __init__(self, rows, seats_per_row, data=None):
+        self.rows = rows
+        self.seats_per_row = seats_per_row
+        self.row_bytes = (seats_per_row + 7) // 8
+        
+        if data is None:
+            # all seats available, unused bits at the end of a row stay 0
+            row_data = bytearray(b"\xff" * self.row_bytes)
+            unused = self.row_bytes * 8 - seats_per_row
+            if unused:
+                row_data[-1] = (0xff << unused) & 0xff
+            data = row_data * rows
+        elif len(data) != rows * self.row_bytes:
+            raise ValueError("Seat map data doesn't match the number of seats")
+        self.data = bytearray(data)
+        
+        # counters kept up to date by book/cancel so counting is O(1)
+        self.row_free = []
+        self.available = 0
+        self.recount()
+        self._runs = {}  # row -> [(start, length)] of free seats, built on demand
+    
+    @classmethod
+    def from_stored(cls, rows, seats_per_row, stored):
+        """Build a seat map from what is stored in an event file
+        stored is the packed text, or the old list of lists of booleans"""
+        if isinstance(stored, SeatMap):
+            return stored
+        if isinstance(stored, str):
+            return cls(rows, seats_per_row, base64.b64decode(stored))
+        
+        seat_map = cls(rows, seats_per_row)
+        for row, seats in enumerate(stored):
+            for seat, is_available in enumerate(seats):
+                if not is_available:
+                    seat_map.book(row, seat)
+        return seat_map
+    
+    def to_stored(self):
+        """Get the packed seats as base64 text (what goes in the event file)"""
+        return base64.b64encode(self.data).decode('ascii')
+    
+    def _position(self, row, seat):
+        """Get (byte index, bit mask) of a seat"""
+        return row * self.row_bytes + seat // 8, 0x80 >> (seat % 8)
+    
+    def is_valid(self, row, seat):
+        """Check that a seat exists"""
+        return 0 <= row < self.rows and 0 <= seat < self.seats_per_row
+    
+    def is_available(self, row, seat):
+        """Check if a seat is available"""
+        index, mask = self._position(row, seat)
+        return bool(self.data[index] & mask)
+    
+    def book(self, row, seat):
+        """Mark a seat as occupied (False if it already was)"""
+        index, mask = self._position(row, seat)
+        if not self.data[index] & mask:
+            return False
+        self.data[index] &= ~mask
+        self.row_free[row] -= 1
+        self.available -= 1
+        self._runs.pop(row, None)
+        return True
+    
+    def cancel(self, row, seat):
+        """Mark a seat as available again (False if it already was)"""
+        index, mask = self._position(row, seat)
+        if self.data[index] & mask:
+            return False
+        self.data[index] |= mask
+        self.row_free[row] += 1
+        self.available += 1
+        self._runs.pop(row, None)
+        return True
+    
+    def copy(self):
+        """Get an independent copy of the seat map"""
+        return SeatMap(self.rows, self.seats_per_row, self.data)
+    
+    def row(self, row):
+        """Get one row as a list of booleans (True = available)"""
+        return [self.is_available(row, seat) for seat in range(self.seats_per_row)]
+    
+    def __iter__(self):
+        # rows as lists of booleans, like the old nested list seat map
+        for row in range(self.rows):
+            yield self.row(row)
+    
+    def count_row(self, row):
+        """Count the available seats of a row from the bits"""
+        start = row * self.row_bytes
+        return bin(int.from_bytes(self.data[start:start + self.row_bytes], 'big')).count('1')
+    
+    def recount(self):
+        """Rebuild the counters from the bits, False if they were wrong"""
+        row_free = [self.count_row(row) for row in range(self.rows)]
+        was_correct = row_free == self.row_free and sum(row_free) == self.available
+        self.row_free = row_free
+        self.available = sum(row_free)
+        return was_correct
+    
+    def free_runs(self, row):
+        """Get the runs of adjacent free seats in a row as (start, length)"""
+        if row not in self._runs:
+            runs = []
+            start = None
+            for seat, is_available in enumerate(self.row(row) + [False]):
+                if is_available and start is None:
+                    start = seat
+                elif not is_available and start is not None:
+                    runs.append((start, seat - start))
+                    start = None
+            self._runs[row] = runs
+        return self._runs[row]
+    
+    def find_best_block(self, count):
+        """Find the best block of count adjacent free seats in one row
+        a block scores its row number plus how far it is from the centre,
+        lower is better. Returns (row, first seat) or None"""
+        centre = (self.seats_per_row - count) / 2  # first seat of a centred block
+        best = None
+        best_score = None
+        
+        for row in range(self.rows):
+            if best_score is not None and row >= best_score:
+                break  # rows further back can't beat the best block
+            if self.row_free[row] < count:
+                continue
+            
+            for start, length in self.free_runs(row):
+                if length < count:
+                    continue
+                # the seat closest to the centre that still fits in this run
+                seat = int(min(max(centre, start), start + length - count))
+                score = row + abs(seat - centre)
+                if best_score is None or score < best_score:
+                    best, best_score = (row, seat), score
+        return best
+    
+    @property
+    def booked(self):
+        """Number of occupied seats"""
+        return self.rows * self.seats_per_row - self.available
+
+def json_default(value):
+    """Let json.dump write seat maps (as their packed text)"""
+    if isinstance(value, SeatMap):
+        return value.to_stored()
+    raise TypeError(f"Can't save {type(value).__name__} to JSON")
+
+def fingerprint(value):
+    """Get a JSON text of value that can be compared to spot changes"""
+    return json.dumps(value, sort_keys=True, default=json_default)
+
+def upgrade_seat_map(event):
+    """Make sure event['seats'] is a SeatMap (event files store it as text,
+    and old files as a list of lists)"""
+    event['seats'] = SeatMap.from_stored(event['rows'], event['seats_per_row'], event['seats'])
+    return event
+
 def create_seat_map(rows, seats_per_row):
-    """Create a new seat map 
-    this is a nested list constructor 
-        _ is a variable but shows that im not gonna use it """ 
-    seatm = [[True for _ in range(seats_per_row)]
-                for _ in range(rows)
-                ]
-    
-    return seatm
-
-def book_seat(event, row, seat, username):
-    """Book a seat for a user"""
-    rows = event['rows']
-    seats_per_row = event['seats_per_row']
-    seat_map = event['seats']
-    
-    if ((0 <= row and row < rows) and (0 <= seat and seat < seats_per_row)):
-        if seat_map[row][seat]:
-            seat_map[row][seat] = False
-            seat_label = f"{row+1}{chr(65+seat)}"
-            event['bookings'][seat_label] = {
-                "user": username,
-                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            return True, seat_label
-        else:
-            return False, "Seat already occupied"
-    return False, "Invalid seat"
+    """Create a new seat map with every seat available"""
+    return SeatMap(rows, seats_per_row)
 
-def cancel_seat(event, row, seat):
-    """Cancel a seat booking"""
-    rows = event['rows']
-    seats_per_row = event['seats_per_row']
+def book_seats(event, seats, username, price=None):
+    """Book several seats (list of (row, seat)) for a user, all or nothing
+    every seat gets a ticket (and a group booking one group id) and they are
+    saved with one journal record, applied only if every seat is still free.
+    price is what was paid per seat (refunded if the ticket is cancelled)
+    returns (True, the 'book' record) or (False, error message)"""
     seat_map = event['seats']
     
-    if 0 <= row and row < rows and 0 <= seat and seat < seats_per_row:
-        if not seat_map[row][seat]:
-            seat_map[row][seat] = True
-            seat_label = f"{row+1}{chr(65+seat)}"
-            if seat_label in event['bookings']:
-                del event['bookings'][seat_label]
-            return True
-    return False
+    if len(set(seats)) != len(seats):
+        return False, "The same seat was selected twice"
+    for row, seat in seats:
+        if not seat_map.is_valid(row, seat):
+            return False, "Invalid seat"
+    
+    record = {
+        'op': 'book',
+        'event_id': event['event_id'],
+        'seats': [[row, seat] for row, seat in seats],
+        'tickets': [new_id("TKT") for _ in seats],
+        'user': username,
+        'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    if price is not None:
+        record['price'] = price
+    if len(seats) > 1:
+        record['group_id'] = new_id("GRP")
+    
+    # applied on top of whatever other terminals booked in the meantime
+    if not append_journal(record):
+        return False, "One of these seats was just taken by someone else"
+    return True, record
 
-def display_seat_map(event):
-    """Display the seat map"""
-    print("\n[X] = Occupied  [ ] = Available\n")
+def display_seat_map(event, selected=()):
+    """Display the seat map
+    seats in selected (a list of (row, seat)) are shown as [*]"""
+    if selected:
+        print("\n[X] = Occupied  [ ] = Available  [*] = Selected\n")
+    else:
+        print("\n[X] = Occupied  [ ] = Available\n")
+    
+    held = held_seats(event['event_id'])
     
     seat_map = event['seats']
     seats_per_row = event['seats_per_row']
@@ -149,66 +1574,1467 @@ def display_seat_map(event):
     for row_idx, row in enumerate(seat_map):
         print(f"{row_idx+1:2d} ", end="")
         for seat_idx, is_available in enumerate(row):
+            if (row_idx, seat_idx) in selected:
+                print("[*]", end=" ")
+            elif is_available and (row_idx, seat_idx) not in held:
+                print("[ ]", end=" ")
+            else:
+                print("[X]", end=" ")
+        print()
+    print()
+
+def get_available_seats(event):
+    """Get number of available seats"""
+    return event['seats'].available
+
+def get_booked_seats(event):
+    """Get number of booked seats"""
+    return event['seats'].booked
+
+def verify_seat_counts(event):
+    """Rebuild the seat counters of an event from its seat map
+    returns False if they had drifted"""
+    return event['seats'].recount()
+
+def seat_label(row, seat):
+    """Get the label of a seat, e.g. row index 4, seat index 1 -> 5B"""
+    return f"{row+1}{chr(65+seat)}"
+
+def parse_seat_label(label):
+    """Get (row, seat) indexes from a label like 5B, None if it isn't one"""
+    match = re.fullmatch(r"(\d+)([A-Z])", label.strip().upper())
+    if not match:
+        return None
+    return int(match.group(1)) - 1, ord(match.group(2)) - 65
+
+def find_best_seats(event, count):
+    """Find count adjacent seats close to the front and centre
+    returns a list of (row, seat), or None if there is no such block"""
+    if count < 1:
+        return None
+    
+    seat_map = event['seats']
+    held = held_seats(event['event_id'])
+    if held:
+        # seats held by other checkouts don't count as free
+        seat_map = seat_map.copy()
+        for row, seat in held:
+            seat_map.book(row, seat)
+    
+    block = seat_map.find_best_block(count)
+    if block is None:
+        return None
+    row, first = block
+    return [(row, seat) for seat in range(first, first + count)]
+
+def get_total_seats(event):
+    """Get total number of seats"""
+    return event['rows'] * event['seats_per_row']
+
+# ============= STALL MAP ===============
+# Vendor stalls are laid out in a grid of STALLS_PER_ROW stalls per row,
+# packed into bits with the same SeatMap class as the seats (cells after
+# the last stall of the last row are marked taken). An approved vendor gets
+# a stall: the one the admin picks, or otherwise the first one that isn't
+# next to a vendor of the same kind (so food stalls end up spread out).
+# event['stall_bookings'] maps stall label -> vendor, and the application
+# keeps its stall label.
+
+STALLS_PER_ROW = 10
+
+def stall_kind(business_type):
+    """Group business types for placement (every kind of food is 'food')"""
+    kind = business_type.strip().lower()
+    return 'food' if 'food' in kind else kind
+
+def layout_stalls(event):
+    """(Re)build an event's stall map for its total_vendor_slots
+    vendors keep their stall if it still exists; the others (and approved
+    vendors that never got one) are placed again"""
+    total = event['total_vendor_slots']
+    per_row = max(1, min(total, STALLS_PER_ROW))
+    rows = -(-total // per_row)
+    stalls = SeatMap(rows, per_row)
+    for index in range(total, rows * per_row):
+        stalls.book(*divmod(index, per_row))
+    
+    old = event.get('stall_bookings', {})
+    event.update(stall_rows=rows, stalls_per_row=per_row, stalls=stalls, stall_bookings={})
+    for label, vendor in old.items():
+        position = parse_seat_label(label)
+        if position and stalls.is_valid(*position) and stalls.is_available(*position):
+            assign_stall(event, vendor, position)
+    unplaced = sorted((app['time'], vendor) for vendor, app in event['vendor_bookings'].items()
+                      if app['status'] == 'approved' and event['stall_bookings'].get(app.get('stall')) != vendor)
+    for _, vendor in unplaced:
+        assign_stall(event, vendor)
+    return event
+
+def upgrade_stall_map(event):
+    """Make sure event['stalls'] is a SeatMap (laid out if the event has none)"""
+    if 'stalls' not in event:
+        return layout_stalls(event)
+    event['stalls'] = SeatMap.from_stored(event['stall_rows'], event['stalls_per_row'], event['stalls'])
+    return event
+
+def place_stall(event, business_type):
+    """Pick a free stall for a vendor, (row, stall) or None if all are taken
+    the first stall with the fewest neighbours of the same kind wins"""
+    stalls = event['stalls']
+    kind = stall_kind(business_type)
+    best, best_score = None, None
+    for row in range(stalls.rows):
+        if not stalls.row_free[row]:
+            continue
+        for stall in range(stalls.seats_per_row):
+            if not stalls.is_available(row, stall):
+                continue
+            neighbours = [stall_business_type(event, r, c)
+                          for r, c in ((row - 1, stall), (row + 1, stall), (row, stall - 1), (row, stall + 1))]
+            score = sum(1 for business_type in neighbours
+                        if business_type is not None and stall_kind(business_type) == kind)
+            if best_score is None or score < best_score:
+                best, best_score = (row, stall), score
+                if not score:
+                    return best
+    return best
+
+def stall_business_type(event, row, stall):
+    """Get the business type of the vendor in a stall (None if nobody is there)"""
+    vendor = event['stall_bookings'].get(seat_label(row, stall))
+    return event['vendor_bookings'][vendor]['business_type'] if vendor else None
+
+def stall_fits(event, position):
+    """Check that a stall exists and is free"""
+    return event['stalls'].is_valid(*position) and event['stalls'].is_available(*position)
+
+def assign_stall(event, vendor, position=None):
+    """Give an approved vendor a stall (a free one is picked if position is None)"""
+    app = event['vendor_bookings'][vendor]
+    if position is None:
+        position = place_stall(event, app['business_type'])
+        if position is None:
+            app.pop('stall', None)  # approved before the stalls ran out
+            return None
+    event['stalls'].book(*position)
+    label = seat_label(*position)
+    event['stall_bookings'][label] = vendor
+    app['stall'] = label
+    return label
+
+def release_stall(event, vendor):
+    """Free the stall of a vendor who is no longer approved"""
+    label = event['vendor_bookings'][vendor].pop('stall', None)
+    if label and event['stall_bookings'].get(label) == vendor:
+        del event['stall_bookings'][label]
+        event['stalls'].cancel(*parse_seat_label(label))
+
+def display_stall_map(event):
+    """Display the stall map"""
+    print("\n[F] = Food vendor  [X] = Other vendor  [ ] = Available\n")
+    
+    stalls = event['stalls']
+    
+    # Column headers
+    print("   ", end="")
+    for i in range(stalls.seats_per_row):
+        print(f"  {chr(65+i)} ", end="")
+    print("\n")
+    
+    # Rows with stalls
+    for row_idx, row in enumerate(stalls):
+        print(f"{row_idx+1:2d} ", end="")
+        for stall_idx, is_available in enumerate(row):
+            business_type = stall_business_type(event, row_idx, stall_idx)
             if is_available:
                 print("[ ]", end=" ")
+            elif business_type is None:
+                print("   ", end=" ")  # past the last stall
+            elif stall_kind(business_type) == 'food':
+                print("[F]", end=" ")
             else:
                 print("[X]", end=" ")
         print()
     print()
 
-def get_available_seats(event):
-    """Get number of available seats"""
-    count = 0
-    for row in event['seats']:
-        count += sum(row)
-    return count
+# ============= SEAT HOLDS ===============
+# During checkout the chosen seats are held, with an expiry time. Holds are
+# rows of the holds table in ADMISSION_DB (one per seat), so every terminal
+# sees them: a seat held by one checkout can't be held by another, and
+# seat maps and the best seat finder leave it out. An abandoned or declined
+# checkout just deletes its rows, and a forgotten one runs out by itself:
+# expired rows are ignored and swept when the next hold is placed.
+
+def held_seats(event_id, exclude_user=None):
+    """Get the set of (row, seat) held in an event (by anyone but exclude_user)
+    seats offered to people on the waitlist count as held too"""
+    with _admission_lock:
+        rows = admission_db().execute("SELECT row_idx, seat_idx FROM holds WHERE event_id = ? AND expires > ? "
+                                      "AND username IS NOT ?", (event_id, time.time(), exclude_user)).fetchall()
+    held = {(r['row_idx'], r['seat_idx']) for r in rows}
+    held.update(tuple(offer['seat']) for username, offer in waitlist_offers(event_id).items()
+                if username != exclude_user)
+    return held
+
+def place_hold(event, seats, username, seconds=None):
+    """Hold free seats for a user during checkout
+    returns (True, hold_id) or (False, error message)"""
+    if seconds is None:
+        seconds = HOLD_SECONDS
+    event_id = event['event_id']
+    seat_map = event['seats']
+    offered = held_seats(event_id, exclude_user=username)
+    
+    if len(set(seats)) != len(seats):
+        return False, "The same seat was selected twice"
+    
+    for row, seat in seats:
+        if not seat_map.is_valid(row, seat):
+            return False, "Invalid seat"
+        if not seat_map.is_available(row, seat):
+            return False, f"Seat {seat_label(row, seat)} already occupied"
+        if (row, seat) in offered:
+            return False, f"Seat {seat_label(row, seat)} is being booked by someone else"
+    
+    hold_id = new_id("HOLD")
+    now = time.time()
+    with _admission_lock:
+        db = admission_db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM holds WHERE expires <= ?", (now,))
+            for row, seat in seats:
+                r = db.execute("SELECT username FROM holds WHERE event_id = ? AND row_idx = ? AND seat_idx = ?",
+                               (event_id, row, seat)).fetchone()
+                if r and r['username'] != username:
+                    return False, f"Seat {seat_label(row, seat)} is being booked by someone else"
+            # a seat the same user was already holding moves to this checkout
+            db.executemany("INSERT OR REPLACE INTO holds VALUES (?, ?, ?, ?, ?, ?)",
+                           [(event_id, row, seat, hold_id, username, now + seconds) for row, seat in seats])
+    return True, hold_id
+
+def get_hold(hold_id):
+    """Get a hold that hasn't expired yet (None otherwise)
+    {'hold_id', 'event_id', 'seats': [(row, seat)], 'user', 'expires'}"""
+    with _admission_lock:
+        rows = admission_db().execute("SELECT * FROM holds WHERE hold_id = ? AND expires > ? "
+                                      "ORDER BY row_idx, seat_idx", (hold_id, time.time())).fetchall()
+    if not rows:
+        return None
+    return {'hold_id': hold_id, 'event_id': rows[0]['event_id'],
+            'seats': [(r['row_idx'], r['seat_idx']) for r in rows],
+            'user': rows[0]['username'], 'expires': rows[0]['expires']}
+
+def release_hold(hold_id):
+    """Give the seats of a hold back"""
+    with _admission_lock:
+        admission_db().execute("DELETE FROM holds WHERE hold_id = ?", (hold_id,))
+
+# ============= WAITLIST ===============
+# People who find an event sold out can join its waitlist. When a ticket
+# is cancelled the freed seat is offered to the next person in line (lowest
+# priority, then first come): it is held for them for WAITLIST_HOLD_SECONDS,
+# after which it goes to the person after them.
+# The queue is a heap, so joining and promoting are O(log n). It is stored
+# per event like the events themselves: a snapshot file plus a journal of
+# join/offer/leave records, so a promotion appends one line instead of
+# rewriting anything. With sqlite it is the waitlist table.
+
+_waitlists = {}  # event_id -> (signature of the snapshot it was built from, state)
+
+def waitlist_paths(event_id):
+    """Get (snapshot file, journal file of generation 0) paths of an event's waitlist"""
+    path, _ = event_paths(event_id)
+    base = path[:-len(".json")]
+    return base + ".waitlist.json", base + ".waitlist"
+
+def load_waitlist(event_id):
+    """Load an event's waitlist state
+    {'seq': next number, 'heap': [(priority, seq, username)],
+     'waiting': {username: (priority, seq, time)}, 'offers': {username: offer},
+     'generation': of the journal}"""
+    snapshot_path, journal_path = waitlist_paths(event_id)
+    signature = file_signature(snapshot_path)
+    cached = _waitlists.get(event_id)
+    if not cached or cached[0] != signature:
+        snapshot = load_json_cached(snapshot_path)
+        state = {'seq': snapshot.get('seq', 0), 'heap': [], 'waiting': {},
+                 'offers': dict(snapshot.get('offers', {})),
+                 'generation': snapshot.get('journal_generation', 0)}
+        for priority, seq, username, joined in snapshot.get('waiting', []):
+            state['waiting'][username] = (priority, seq, joined)
+            state['heap'].append((priority, seq, username))
+        heapq.heapify(state['heap'])
+        cached = _waitlists[event_id] = (signature, state)
+        start = snapshot.get('journal_offset', 0)  # written before journals were rotated
+    else:
+        start = 0
+    
+    state = cached[1]
+    replay_journal(state, journal_file(journal_path, state['generation']), apply_waitlist_record, start)
+    return state
+
+def save_waitlist(event_id, state, generation):
+    """Write a waitlist snapshot of a journal generation (see compact_journal)"""
+    snapshot_path, journal_path = waitlist_paths(event_id)
+    waiting = sorted([priority, seq, username, joined]
+                     for username, (priority, seq, joined) in state['waiting'].items())
+    journal_path = start_journal(journal_path, generation)
+    save_json_cached(snapshot_path, {'seq': state['seq'], 'waiting': waiting,
+                                     'offers': state['offers'], 'journal_generation': generation})
+    state['generation'] = generation
+    _journal_state[journal_path] = {'target': state, 'offset': 0, 'count': 0}
+    _waitlists[event_id] = (file_signature(snapshot_path), state)
+
+def compact_waitlist(event_id, generation):
+    """Fold an event's waitlist journal into its snapshot and start the next journal"""
+    snapshot_path, journal_path = waitlist_paths(event_id)
+    compact_journal(snapshot_path, journal_path, generation, lambda: load_waitlist(event_id),
+                    lambda state, new_generation: save_waitlist(event_id, state, new_generation))
+
+def apply_waitlist_record(state, record):
+    """Apply one waitlist journal record"""
+    username = record['user']
+    if record['op'] == 'join':
+        if username in state['waiting'] or username in state['offers']:
+            return
+        seq = state['seq']
+        state['seq'] += 1
+        state['waiting'][username] = (record['priority'], seq, record['time'])
+        heapq.heappush(state['heap'], (record['priority'], seq, username))
+    elif record['op'] == 'offer':
+        state['waiting'].pop(username, None)  # its heap entry is skipped from now on
+        state['offers'][username] = {'seat': record['seat'], 'expires': record['expires']}
+    elif record['op'] == 'leave':
+        state['waiting'].pop(username, None)
+        state['offers'].pop(username, None)
+
+def append_waitlist(event_id, record):
+    """Append a record to an event's waitlist journal"""
+    snapshot_path, journal_path = waitlist_paths(event_id)
+    for _ in range(SAVE_RETRIES):
+        generation = load_waitlist(event_id)['generation']
+        if write_journal(snapshot_path, journal_file(journal_path, generation), generation, record):
+            break
+        compact_waitlist(event_id, generation)  # sealed before our record
+    
+    generation = load_waitlist(event_id)['generation']
+    if _journal_state[journal_file(journal_path, generation)]['count'] >= JOURNAL_COMPACT_EVERY:
+        compact_waitlist(event_id, generation)
+
+def join_waitlist(event_id, username, priority=0):
+    """Put a user on an event's waitlist
+    returns (True, number of people waiting) or (False, error message)"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    if STORAGE_BACKEND == 'sqlite':
+        db = get_db()
+        with db:
+            cur = db.execute("INSERT OR IGNORE INTO waitlist (event_id, username, priority, time) "
+                             "VALUES (?, ?, ?, ?)", (event_id, username, priority, now))
+        if not cur.rowcount:
+            return False, "You are already on the waitlist"
+        return True, waitlist_size(event_id)
+    
+    state = load_waitlist(event_id)
+    if username in state['waiting'] or username in state['offers']:
+        return False, "You are already on the waitlist"
+    append_waitlist(event_id, {'op': 'join', 'user': username, 'priority': priority, 'time': now})
+    return True, waitlist_size(event_id)
+
+def leave_waitlist(event_id, username):
+    """Take a user (and any seat offered to them) off an event's waitlist"""
+    if STORAGE_BACKEND == 'sqlite':
+        db = get_db()
+        with db:
+            db.execute("DELETE FROM waitlist WHERE event_id = ? AND username = ?", (event_id, username))
+        return
+    
+    state = load_waitlist(event_id)
+    had_offer = username in state['offers']
+    if username in state['waiting'] or had_offer:
+        append_waitlist(event_id, {'op': 'leave', 'user': username})
+    if had_offer:
+        append_manifest({'op': 'leave', 'event_id': event_id, 'user': username})
+
+def waitlist_size(event_id):
+    """Get the number of people waiting (not counting open offers)"""
+    if STORAGE_BACKEND == 'sqlite':
+        return get_db().execute("SELECT COUNT(*) FROM waitlist WHERE event_id = ? AND offer_expires IS NULL",
+                                (event_id,)).fetchone()[0]
+    return len(load_waitlist(event_id)['waiting'])
+
+def next_waiter(event_id):
+    """Get the username at the front of the waitlist (None if it is empty)"""
+    if STORAGE_BACKEND == 'sqlite':
+        r = get_db().execute("SELECT username FROM waitlist WHERE event_id = ? AND offer_expires IS NULL "
+                             "ORDER BY priority, id LIMIT 1", (event_id,)).fetchone()
+        return r['username'] if r else None
+    
+    state = load_waitlist(event_id)
+    heap = state['heap']
+    # drop entries of people who left or already got an offer
+    while heap and state['waiting'].get(heap[0][2], (None, None))[1] != heap[0][1]:
+        heapq.heappop(heap)
+    return heap[0][2] if heap else None
+
+def promote_waitlist(event_id, seats):
+    """Offer freed seats (list of (row, seat)) to the next people in line
+    returns a list of (username, (row, seat)) offers made"""
+    event = load_event(event_id)
+    offers = []
+    for row, seat in seats:
+        if not event or not event['seats'].is_available(row, seat):
+            continue
+        username = next_waiter(event_id)
+        if username is None:
+            break
+        expires = time.time() + WAITLIST_HOLD_SECONDS
+        if STORAGE_BACKEND == 'sqlite':
+            db = get_db()
+            with db:
+                db.execute("UPDATE waitlist SET offer_row = ?, offer_seat = ?, offer_expires = ? "
+                           "WHERE event_id = ? AND username = ?", (row, seat, expires, event_id, username))
+        else:
+            append_waitlist(event_id, {'op': 'offer', 'user': username, 'seat': [row, seat], 'expires': expires})
+            append_manifest({'op': 'offer', 'event_id': event_id, 'user': username})
+        offers.append((username, (row, seat)))
+    return offers
+
+def waitlist_offers(event_id):
+    """Get username -> {'seat': [row, seat], 'expires': time} of open offers
+    offers that ran out are withdrawn and their seats passed on"""
+    now = time.time()
+    
+    if STORAGE_BACKEND == 'sqlite':
+        db = get_db()
+        rows = db.execute("SELECT username, offer_row, offer_seat, offer_expires FROM waitlist "
+                          "WHERE event_id = ? AND offer_expires IS NOT NULL", (event_id,)).fetchall()
+        offers = {r['username']: {'seat': [r['offer_row'], r['offer_seat']], 'expires': r['offer_expires']}
+                  for r in rows}
+    else:
+        offers = load_waitlist(event_id)['offers']
+    
+    expired = [username for username, offer in offers.items() if offer['expires'] <= now]
+    if not expired:
+        return offers
+    seats = [tuple(offers[username]['seat']) for username in expired]
+    for username in expired:
+        leave_waitlist(event_id, username)
+    promote_waitlist(event_id, seats)
+    return waitlist_offers(event_id)
+
+# With JSON storage every offer made or withdrawn is also recorded in the
+# manifest (the users with open offers are kept in each event's entry), and
+# an index of them by user is built from it, so the user menu only looks at
+# the waitlists of the events that offered that user a seat.
+
+_offer_index = {
+    'manifest': None,  # the manifest the index was built from
+    'users': {}        # username -> set of event ids with an offer made to them
+}
+
+def apply_offer_record(manifest, record):
+    """Apply a manifest record of an offer made ('offer'), withdrawn or taken
+    ('leave'), or of all open offers of an event ('offers')"""
+    event_id, op = record['event_id'], record['op']
+    if event_id not in manifest:
+        return
+    offers = manifest[event_id].setdefault('offers', [])
+    users = _offer_index['users'] if manifest is _offer_index['manifest'] else {}
+    if op == 'offers':
+        for username in offers:
+            users.get(username, set()).discard(event_id)
+        offers[:] = record['users']
+        for username in offers:
+            users.setdefault(username, set()).add(event_id)
+    elif op == 'offer':
+        if record['user'] not in offers:
+            offers.append(record['user'])
+        users.setdefault(record['user'], set()).add(event_id)
+    elif record['user'] in offers:
+        offers.remove(record['user'])
+        users.get(record['user'], set()).discard(event_id)
+
+def offer_index():
+    """Get username -> event ids with a waitlist offer made to them"""
+    manifest = load_manifest()
+    if _offer_index['manifest'] is manifest:
+        return _offer_index['users']
+    
+    missing = [event_id for event_id, entry in manifest.items() if 'offers' not in entry]
+    if missing:
+        # manifest written before offers were recorded in it -> look them up once
+        for event_id in missing:
+            append_manifest({'op': 'offers', 'event_id': event_id,
+                             'users': sorted(load_waitlist(event_id)['offers'])})
+        manifest = load_manifest()
+    users = {}
+    for event_id, entry in manifest.items():
+        for username in entry.get('offers', []):
+            users.setdefault(username, set()).add(event_id)
+    _offer_index.update(manifest=manifest, users=users)
+    return users
+
+def get_user_offers(username):
+    """Get (event_id, offer) of every open waitlist offer made to a user"""
+    if STORAGE_BACKEND == 'sqlite':
+        event_ids = [r['event_id'] for r in get_db().execute(
+            "SELECT event_id FROM waitlist WHERE username = ? AND offer_expires IS NOT NULL", (username,))]
+    else:
+        event_ids = sorted(offer_index().get(username, ()))
+        manifest = load_manifest()
+        event_ids = [event_id for event_id in event_ids if event_id in manifest]
+    
+    offers = []
+    for event_id in event_ids:
+        offer = waitlist_offers(event_id).get(username)
+        if offer:
+            offers.append((event_id, offer))
+    return offers
+
+# =============== EVENT FUNCTIONS =================
+
+def create_event(event_id, name, date, location, price, rows, seats_per_row, vendor_slots, description=""):
+    """Create a new event"""
+    event = {
+        'event_id': event_id,
+        'name': name,
+        'date': date,
+        'location': location,
+        'price': price,
+        'rows': rows,
+        'seats_per_row': seats_per_row,
+        'seats': create_seat_map(rows, seats_per_row),
+        'bookings': {},
+        'total_vendor_slots': vendor_slots,
+        'vendor_bookings': {},
+        'vendor_counts': dict.fromkeys(VENDOR_STATUSES, 0),
+        'refunds': {},
+        'description': description
+    }
+    return layout_stalls(event)
+
+# event['vendor_counts'] keeps the number of applications per status, updated
+# as applications come in and get reviewed, so availability is never counted
+VENDOR_STATUSES = ('pending', 'approved', 'rejected')
+
+def upgrade_vendor_counts(event):
+    """Count the applications of an event saved before vendor_counts existed"""
+    if 'vendor_counts' in event:
+        return
+    event['vendor_counts'] = dict.fromkeys(VENDOR_STATUSES, 0)
+    for app in event['vendor_bookings'].values():
+        count_vendor_status(event, app['status'], 1)
+
+def count_vendor_status(event, status, change):
+    """Add change (+1/-1) to the number of applications with a status"""
+    counts = event['vendor_counts']
+    counts[status] = counts.get(status, 0) + change
+
+def get_available_vendor_slots(event):
+    """Get number of available vendor slots"""
+    return event['total_vendor_slots'] - event['vendor_counts']['approved']
+
+def approval_fits(event, vendors):
+    """Check that approving these vendors doesn't take more stalls than are left"""
+    new = sum(1 for vendor in vendors if event['vendor_bookings'][vendor]['status'] != 'approved')
+    return new <= get_available_vendor_slots(event)
+
+def event_summary(event):
+    """Get the fields shown in event listings (everything but the seat map)"""
+    return {
+        'event_id': event['event_id'],
+        'name': event['name'],
+        'date': event['date'],
+        'location': event['location'],
+        'price': event['price'],
+        'total_seats': get_total_seats(event),
+        'available_seats': get_available_seats(event),
+        'total_vendor_slots': event['total_vendor_slots'],
+        'available_vendor_slots': get_available_vendor_slots(event),
+        'refunds_owed': sum(1 for refund in event.get('refunds', {}).values() if not refund['refund_id']),
+        'version': event.get('version', 0)
+    }
+
+# ================= BOOKING FUNCTIONS ==========================
+# event['bookings'] (seat label -> user, time, ticket_id) is the one record
+# of a booking. The per-user tickets and the ticket id lookup are indexes
+# over it, kept in memory and updated whenever an event is loaded or a seat
+# is booked/cancelled, so a purchase is a single journal write.
+# The per-user entries also carry the event name and date, so My Bookings
+# reads nothing but that user's slice.
+
+_booking_index = {
+    'users': {},    # username -> {event_id: {seat label: booking + event name/date}}
+    'tickets': {},  # ticket_id -> (username, booking)
+    'events': {}    # event_id -> {seat label: ticket_id}
+}
+
+def user_booking(event_id, seat_label, info):
+    """The per-user view of a seat booking (what My Bookings shows)"""
+    booking = {
+        'ticket_id': info['ticket_id'],
+        'event_id': event_id,
+        'seat': seat_label,
+        'time': info['time']
+    }
+    if info.get('group_id'):
+        booking['group_id'] = info['group_id']
+    return booking
+
+def index_booking(event, seat_label, info):
+    """Add a seat booking of an event to the booking index"""
+    if not info.get('ticket_id'):
+        return  # booked before tickets existed, nothing to look up
+    event_id = event['event_id']
+    unindex_booking(event_id, seat_label)
+    booking = user_booking(event_id, seat_label, info)
+    booking.update(event_name=event['name'], event_date=event['date'])
+    _booking_index['users'].setdefault(info['user'], {}).setdefault(event_id, {})[seat_label] = booking
+    _booking_index['tickets'][info['ticket_id']] = (info['user'], booking)
+    _booking_index['events'].setdefault(event_id, {})[seat_label] = info['ticket_id']
+
+def unindex_booking(event_id, seat_label):
+    """Remove a seat booking from the booking index"""
+    ticket_id = _booking_index['events'].get(event_id, {}).pop(seat_label, None)
+    if ticket_id:
+        username, _ = _booking_index['tickets'].pop(ticket_id)
+        user_events = _booking_index['users'][username]
+        user_events[event_id].pop(seat_label, None)
+        if not user_events[event_id]:
+            del user_events[event_id]
+
+def index_event(event_id, event):
+    """(Re)build the booking and application index entries of one event
+    (event None = deleted)"""
+    for label in list(_booking_index['events'].get(event_id, {})):
+        unindex_booking(event_id, label)
+    _booking_index['events'].pop(event_id, None)
+    for vendor in list(_application_index['events'].get(event_id, {})):
+        unindex_application(event_id, vendor)
+    _application_index['events'].pop(event_id, None)
+    if event:
+        for label, info in event['bookings'].items():
+            index_booking(event, label, info)
+        for vendor, app in event['vendor_bookings'].items():
+            index_application(event, vendor, app)
+
+# Every change to an event is followed by a summary record in the manifest
+# journal, so replaying that journal tells which events changed since the
+# indexes were last brought up to date and only those are loaded again.
+# A manifest another process compacted is read afresh; then the event
+# versions in its summaries are compared with the versions indexed.
+
+_changed_events = set()  # event ids with manifest records since the last refresh
+_index_state = {
+    'manifest': None,  # the manifest the changes were tracked against
+    'versions': {}     # event_id -> version of the event as last indexed
+}
+
+def refresh_indexes():
+    """Bring the booking and application indexes up to date with storage"""
+    if STORAGE_BACKEND == 'sqlite':
+        events = load_events()  # cached until the database changes
+        for event_id in set(_booking_index['events']) | set(_application_index['events']):
+            if event_id not in events:
+                index_event(event_id, None)
+        return
+    
+    manifest = load_manifest()
+    versions = _index_state['versions']
+    if manifest is _index_state['manifest']:
+        changed = set(_changed_events)
+    else:
+        changed = {event_id for event_id, entry in manifest.items()
+                   if entry.get('version') is None or entry['version'] != versions.get(event_id)}
+        changed.update(event_id for event_id in versions if event_id not in manifest)
+        _index_state['manifest'] = manifest
+    _changed_events.clear()  # records replayed while loading count for next time
+    
+    for event_id in changed:
+        event = load_event_file(event_id) if event_id in manifest else None
+        if event is None:
+            index_event(event_id, None)
+            versions.pop(event_id, None)
+        else:
+            versions[event_id] = event.get('version', 0)
+
+def booking_index():
+    """Get the booking index with every event's current bookings in it"""
+    refresh_indexes()
+    return _booking_index
+
+def attach_legacy_tickets(event):
+    """Fill in the ticket ids of bookings made when they were only kept
+    per user in BOOKINGS_FILE"""
+    if all('ticket_id' in info for info in event['bookings'].values()):
+        return
+    for username, tickets in load_json_cached(BOOKINGS_FILE).items():
+        for booking in tickets:
+            if booking['event_id'] != event['event_id']:
+                continue
+            info = event['bookings'].get(booking['seat'])
+            if info and info['user'] == username and 'ticket_id' not in info:
+                info['ticket_id'] = booking['ticket_id']
+                if booking.get('group_id'):
+                    info['group_id'] = booking['group_id']
+
+def cancel_ticket(username, event_id, label):
+    """Cancel a user's ticket and refund it
+    a ticket already used at the gate can't be cancelled: its code is revoked
+    first, which fails if it was checked in (see revoke_ticket). Then the seat
+    is freed, the booking removed and the refund it is owed recorded with one
+    journal record; the refund is only paid out once that is saved, so of two
+    terminals cancelling the same ticket just one pays it.
+    Returns (True, refund result) or (False, error message)"""
+    event = load_event(event_id)
+    info = event['bookings'].get(label) if event else None
+    if not info or info['user'] != username or not info.get('ticket_id'):
+        return False, "You have no ticket for that seat"
+    amount = info.get('price', event['price'])  # booked before prices were kept: the price now
+    
+    if not revoke_ticket(info['ticket_id'], event_id):
+        return False, "This ticket was already used at the gate"
+    if not append_journal({
+        'op': 'cancel',
+        'event_id': event_id,
+        'seats': [list(parse_seat_label(label))],
+        'ticket_id': info['ticket_id'],
+        'user': username,
+        'refund': {'refund_id': "", 'amount': amount},  # owed until settled
+        'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }):
+        return False, "This ticket was already cancelled"
+    
+    promote_waitlist(event_id, [parse_seat_label(label)])
+    return True, settle_refund(event_id, info['ticket_id'], amount)
+
+def settle_refund(event_id, ticket_id, amount):
+    """Pay out the refund owed for a cancelled ticket and record its refund id
+    refunds are keyed by ticket id, so retrying never refunds twice"""
+    refund = process_refund(amount, ticket_id)
+    if refund['ok']:
+        append_journal({'op': 'refund', 'event_id': event_id, 'ticket_id': ticket_id,
+                        'refund_id': refund['refund_id']})
+    return refund
+
+def get_owed_refunds():
+    """Get (event_id, ticket_id, refund) of every refund that wasn't paid out yet
+    (the payout failed, or the program stopped between the cancel and the payout)"""
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute("SELECT * FROM refunds WHERE refund_id = '' ORDER BY time, rowid")
+        return [(r['event_id'], r['ticket_id'], {'amount': r['amount'], 'refund_id': r['refund_id'],
+                                                 'user': r['username'], 'seat': r['seat'], 'time': r['time']})
+                for r in rows]
+    
+    owed = []
+    for event_id, summary in get_event_summaries().items():
+        if summary['refunds_owed']:  # only those events are loaded
+            event = load_event(event_id)
+            owed.extend((event_id, ticket_id, refund) for ticket_id, refund in event['refunds'].items()
+                        if not refund['refund_id'])
+    return sorted(owed, key=lambda item: item[2]['time'])
+
+def settle_owed_refunds():
+    """Retry the payout of every owed refund
+    returns a list of (event_id, ticket_id, refund result)"""
+    return [(event_id, ticket_id, settle_refund(event_id, ticket_id, refund['amount']))
+            for event_id, ticket_id, refund in get_owed_refunds()]
+
+# ================= VENDOR APPLICATIONS ==========================
+# Applications are kept in event['vendor_bookings'] (vendor -> application)
+# and each one is saved on its own with a vendor_apply/vendor_status journal
+# record. Like the bookings they are indexed in memory, by status, event
+# and vendor, so the review queue only looks at pending applications and
+# My Applications only at that vendor's own. The pending ones are also kept
+# in order of application time, so a page of the queue is a slice.
+
+# every entry is {'event_id', 'event_name', 'event_date', 'vendor', 'app'}
+_application_index = {
+    'status': {},   # status -> {(event_id, vendor): entry}
+    'events': {},   # event_id -> {vendor: status}
+    'vendors': {},  # vendor -> {event_id: entry}
+    'queue': []     # sorted (time, event_id, vendor) of the pending applications
+}
+
+def index_application(event, vendor, app):
+    """Add (or move) an application in the application index"""
+    event_id = event['event_id']
+    unindex_application(event_id, vendor)
+    entry = {'event_id': event_id, 'event_name': event['name'], 'event_date': event['date'],
+             'vendor': vendor, 'app': app}
+    _application_index['status'].setdefault(app['status'], {})[(event_id, vendor)] = entry
+    _application_index['events'].setdefault(event_id, {})[vendor] = app['status']
+    _application_index['vendors'].setdefault(vendor, {})[event_id] = entry
+    if app['status'] == 'pending':
+        bisect.insort(_application_index['queue'], (app['time'], event_id, vendor))
+
+def unindex_application(event_id, vendor):
+    """Remove an application from the application index"""
+    status = _application_index['events'].get(event_id, {}).pop(vendor, None)
+    if status:
+        entry = _application_index['status'][status].pop((event_id, vendor))
+        if status == 'pending':
+            queue = _application_index['queue']
+            del queue[bisect.bisect_left(queue, (entry['app']['time'], event_id, vendor))]
+        vendor_apps = _application_index['vendors'][vendor]
+        vendor_apps.pop(event_id, None)
+        if not vendor_apps:
+            del _application_index['vendors'][vendor]
+
+def application_index():
+    """Get the application index with every event's current applications in it"""
+    refresh_indexes()
+    return _application_index
+
+def plan_bulk_decision(applications, status, limit=None):
+    """Group the applications to decide by event (event_id -> vendors)
+    approvals go oldest first and stop at the stalls left in each event,
+    and at limit applications in total if given"""
+    summaries = get_event_summaries()
+    plan = {}
+    taken = 0
+    for item in applications:
+        if limit is not None and taken >= limit:
+            break
+        vendors = plan.setdefault(item['event_id'], [])
+        if status == 'approved' and len(vendors) >= summaries[item['event_id']]['available_vendor_slots']:
+            continue
+        vendors.append(item['vendor'])
+        taken += 1
+    return {event_id: vendors for event_id, vendors in plan.items() if vendors}
+
+def apply_bulk_decision(plan, status, message=""):
+    """Approve/reject the planned applications with one journal record per event
+    An event's batch is saved whole or not at all (e.g. if its stalls ran
+    out in the meantime); returns event_id -> True/False"""
+    results = {}
+    for event_id, vendors in plan.items():
+        results[event_id] = append_journal({
+            'op': 'vendor_batch',
+            'event_id': event_id,
+            'vendors': vendors,
+            'status': status,
+            'message': message
+        })
+    return results
+
+# ================= TICKET IDS ==========================
+# Ticket ids are Snowflake style numbers: milliseconds since ID_EPOCH_MS,
+# then the node number, then a per-millisecond sequence. They never repeat
+# (every running process holds its own node number) and need no lookup of
+# the existing bookings. Written in base 36 after a prefix, e.g. TKT1STVQ33HCHDS.
+
+ID_EPOCH_MS = 1735689600000  # 2025-01-01 00:00:00 UTC
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+
+_id_state = {'last_ms': 0, 'sequence': 0}
+_id_lock = threading.Lock()
+_node = {'pid': None, 'id': None, 'file': None}  # node number held by this process
+
+def get_node_id():
+    """Get the node number of this process
+    the first free one is locked in NODES_DIR and held until the process
+    exits, so terminals sharing the folder never get the same number"""
+    if NODE_ID is not None:
+        return int(NODE_ID)
+    if _node['pid'] != os.getpid():  # first call, or a forked child of the holder
+        count = 1 << NODE_BITS
+        os.makedirs(NODES_DIR, exist_ok=True)
+        for i in range(count):
+            node_id = (os.getpid() + i) % count
+            f = open(os.path.join(NODES_DIR, f"{node_id}.lock"), 'a')
+            if lock_file(f):
+                _node.update(pid=os.getpid(), id=node_id, file=f)  # closing it would drop the lock
+                break
+            f.close()
+        else:
+            raise RuntimeError(f"All {count} node numbers are in use")
+    return _node['id']
+
+def lock_file(f, wait=False):
+    """Lock an open file for this process, returns False if it is locked
+    elsewhere and wait is False"""
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+def unlock_file(f):
+    """Release a lock taken with lock_file"""
+    if fcntl:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def to_base36(number):
+    """Write a number in base 36 (0-9, A-Z)"""
+    digits = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    text = ""
+    while number:
+        number, digit = divmod(number, 36)
+        text = digits[digit] + text
+    return text or "0"
+
+def new_id(prefix="TKT"):
+    """Allocate a new unique id (tickets, ticket groups, ...)"""
+    with _id_lock:
+        now = max(int(time.time() * 1000), _id_state['last_ms'])  # never go back in time
+        if now == _id_state['last_ms']:
+            _id_state['sequence'] = (_id_state['sequence'] + 1) % (1 << SEQUENCE_BITS)
+            if _id_state['sequence'] == 0:
+                # used up this millisecond, move on to the next one
+                now += 1
+                while int(time.time() * 1000) < now:
+                    time.sleep(0.0001)
+        else:
+            _id_state['sequence'] = 0
+        _id_state['last_ms'] = now
+        
+        number = ((now - ID_EPOCH_MS) << (NODE_BITS + SEQUENCE_BITS)) \
+            | ((get_node_id() % (1 << NODE_BITS)) << SEQUENCE_BITS) | _id_state['sequence']
+    return prefix + to_base36(number).rjust(12, "0")
+
+def find_ticket(ticket_id):
+    """Look a ticket up by id, returns (username, booking) or None"""
+    if STORAGE_BACKEND == 'sqlite':
+        r = get_db().execute("SELECT * FROM seat_bookings WHERE ticket_id = ?", (ticket_id,)).fetchone()
+        if r is None:
+            return None
+        return r['username'], sql_user_booking(r)
+    return booking_index()['tickets'].get(ticket_id)
+
+# ================= TICKET CODES ==========================
+# A ticket code is the event id, seat and ticket id signed with HMAC-SHA256,
+# e.g. ZXZlbnQxfDFBfFRLVDY3NDI4.Qm9vF1Yy6Q2rW0e3. A gate holding the key
+# can tell a real ticket from a made up one without reading any storage.
+# The key comes from CARNIVAL_TICKET_KEY or TICKET_KEY_FILE (made on first use).
+
+_ticket_key = {}
+
+def get_ticket_key():
+    """Get the key ticket codes are signed with"""
+    if 'key' not in _ticket_key:
+        key = os.environ.get("CARNIVAL_TICKET_KEY", "").encode()
+        if not key:
+            if not os.path.exists(TICKET_KEY_FILE):
+                create_key_file(TICKET_KEY_FILE)
+            with open(TICKET_KEY_FILE, 'r') as f:
+                key = f.read().strip().encode()
+        _ticket_key['key'] = key
+    return _ticket_key['key']
+
+def create_key_file(path):
+    """Write a new random key that only the owner can read
+    (if another terminal creates it at the same time, its key is kept)"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(os.urandom(32).hex())
+    try:
+        os.link(temp_path, path)  # fails if the file exists, unlike os.replace
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temp_path)
+
+def b64_encode(data):
+    """URL safe base64 without the '=' padding"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def b64_decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def ticket_code(event_id, seat_label, ticket_id):
+    """Make the signed code printed on a ticket"""
+    payload = b64_encode(f"{event_id}|{seat_label}|{ticket_id}".encode())
+    mac = hmac.new(get_ticket_key(), payload.encode(), hashlib.sha256).digest()[:12]
+    return payload + "." + b64_encode(mac)
+
+def verify_ticket_code(code):
+    """Check the signature of a ticket code (no storage access)
+    returns (event_id, seat_label, ticket_id) or None if it is forged/damaged"""
+    payload, _, mac = code.partition(".")
+    expected = hmac.new(get_ticket_key(), payload.encode(), hashlib.sha256).digest()[:12]
+    try:
+        if not hmac.compare_digest(b64_decode(mac), expected):
+            return None
+        # event ids are free text and may contain "|", seat labels and ticket ids don't
+        fields = b64_decode(payload).decode().rsplit("|", 2)
+    except ValueError:
+        return None
+    if len(fields) != 3:
+        return None
+    return tuple(fields)
+
+# ================= GATE CHECK-IN ==========================
+# Tickets are checked at the gate by id (via the ticket index) or by their
+# signed code (no lookup at all), and every admitted ticket is appended to
+# CHECKINS_FILE. Cancelled tickets are appended too, marked 'cancelled', so
+# the duplicate check also turns away their codes, and a ticket that was
+# checked in can no longer be cancelled. The tickets that are already in
+# (or cancelled) are kept in memory and pick up lines other gates append.
+
+_checked_in = {}  # ticket_id -> its first CHECKINS_FILE line
+
+def apply_checkin(checked_in, record):
+    """Add one line of CHECKINS_FILE to the checked in tickets"""
+    checked_in.setdefault(record['ticket_id'], record)
+
+def check_in(ticket_id, event_id=None):
+    """Check a ticket in at the gate
+    returns (result, booking): result is 'ok', 'duplicate', 'cancelled',
+    'invalid' or 'wrong_event'. For a duplicate the booking has the first
+    'checked_in' time"""
+    found = find_ticket(ticket_id)
+    if not found:
+        return 'invalid', None
+    username, booking = found
+    if event_id and booking['event_id'] != event_id:
+        return 'wrong_event', booking
+    
+    return admit(dict(booking, user=username))
+
+def check_in_code(code, event_id=None):
+    """Check a signed ticket code in at the gate, same results as check_in
+    only the duplicate/cancelled check touches storage"""
+    fields = verify_ticket_code(code)
+    if not fields:
+        return 'invalid', None
+    booking = dict(zip(('event_id', 'seat', 'ticket_id'), fields))
+    if event_id and booking['event_id'] != event_id:
+        return 'wrong_event', booking
+    
+    return admit(booking)
+
+def admit(booking):
+    """Record a valid ticket as checked in, returns (result, booking) like check_in"""
+    first = record_checkin(booking['ticket_id'], booking['event_id'])
+    if not first:
+        return 'ok', booking
+    if first.get('cancelled'):
+        return 'cancelled', booking
+    return 'duplicate', dict(booking, checked_in=first['time'])
+
+def record_checkin(ticket_id, event_id, cancelled=False):
+    """Mark a ticket as checked in (or as cancelled)
+    returns None, or the first record ({'time', 'cancelled'}) if it was already in"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    if STORAGE_BACKEND == 'sqlite':
+        db = get_db()
+        with db:
+            cur = db.execute("INSERT OR IGNORE INTO checkins (ticket_id, event_id, time, cancelled) "
+                             "VALUES (?, ?, ?, ?)", (ticket_id, event_id, now, int(cancelled)))
+        if not cur.rowcount:
+            return dict(db.execute("SELECT time, cancelled FROM checkins WHERE ticket_id = ?",
+                                   (ticket_id,)).fetchone())
+        return None
+    
+    replay_journal(_checked_in, CHECKINS_FILE, apply_checkin)
+    if ticket_id in _checked_in:
+        return _checked_in[ticket_id]
+    
+    record = {'ticket_id': ticket_id, 'event_id': event_id, 'time': now}
+    if cancelled:
+        record['cancelled'] = True
+    with open(CHECKINS_FILE, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    replay_journal(_checked_in, CHECKINS_FILE, apply_checkin)
+    first = _checked_in[ticket_id]  # another gate may have appended its line first
+    return None if first == record else first
+
+def revoke_ticket(ticket_id, event_id):
+    """Turn a ticket that is being cancelled away at the gate
+    returns False if it was already checked in (then it can't be cancelled);
+    whichever of the gate and the cancel records the ticket first wins"""
+    first = record_checkin(ticket_id, event_id, cancelled=True)
+    return not first or bool(first.get('cancelled'))
+
+# ================= PAYMENTS ==========================
+# Payments go through a provider object. charge() returns a Future right
+# away, so a slow gateway never holds up the rest of the program and many
+# checkouts can wait on their payments at the same time.
 
-def get_total_seats(event):
-    """Get total number of seats"""
-    return event['rows'] * event['seats_per_row']
+class PaymentProvider:
+    """Interface every payment gateway has to implement"""
+    
+    def charge(self, amount, reference):
+        """Start charging amount, returns a Future of a result dict
+        {'ok': bool, 'payment_id': str, 'amount': float, 'reason': str}"""
+        raise NotImplementedError
+    
+    def refund(self, amount, reference):
+        """Start refunding amount for reference (a ticket id), returns a Future
+        of {'ok': bool, 'refund_id': str, 'amount': float, 'reason': str}.
+        Refunding the same reference again must not pay out twice"""
+        raise NotImplementedError
 
-# =============== EVENT FUNCTIONS =================
+class LocalPaymentStub(PaymentProvider):
+    """Pretend gateway with a fixed latency and random declines"""
+    
+    def __init__(self, latency=PAYMENT_LATENCY, failure_rate=PAYMENT_FAILURE_RATE, workers=PAYMENT_WORKERS):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="payment")
+        self.counter = 0
+        self.refunds = {}  # reference -> Future of its refund
+    
+    def charge(self, amount, reference):
+        self.counter += 1
+        payment_id = f"PAY{os.getpid()}-{self.counter}"
+        return self.executor.submit(self._charge, payment_id, amount, reference)
+    
+    def _charge(self, payment_id, amount, reference):
+        time.sleep(self.latency)  # runs in a worker thread
+        ok = random.random() >= self.failure_rate
+        return {
+            'ok': ok,
+            'payment_id': payment_id,
+            'amount': amount,
+            'reference': reference,
+            'reason': "" if ok else "Declined by bank"
+        }
+    
+    def refund(self, amount, reference):
+        if reference not in self.refunds:
+            self.counter += 1
+            refund_id = f"REF{os.getpid()}-{self.counter}"
+            self.refunds[reference] = self.executor.submit(self._refund, refund_id, amount, reference)
+        return self.refunds[reference]
+    
+    def _refund(self, refund_id, amount, reference):
+        time.sleep(self.latency)
+        return {'ok': True, 'refund_id': refund_id, 'amount': amount, 'reference': reference, 'reason': ""}
 
-def create_event(event_id, name, date, location, price, rows, seats_per_row, vendor_slots, description=""):
-    """Create a new event"""
-    event = {
-        'event_id': event_id,
-        'name': name,
-        'date': date,
-        'location': location,
-        'price': price,
-        'rows': rows,
-        'seats_per_row': seats_per_row,
-        'seats': create_seat_map(rows, seats_per_row),
-        'bookings': {},
-        'total_vendor_slots': vendor_slots,
-        'vendor_bookings': {},
-        'description': description
-    }
-    return event 
+_payment_provider = None
 
-def get_available_vendor_slots(event):
-    """Get number of available vendor slots"""
-    inuse = 0 
-    for v in event['vendor_bookings'].values():
-        if v['status'] == 'approved':
-            inuse +=1 
-    approved = inuse 
-    return event['total_vendor_slots'] - approved
+def get_payment_provider():
+    """Get the payment provider (a LocalPaymentStub unless one was set)"""
+    global _payment_provider
+    if _payment_provider is None:
+        _payment_provider = LocalPaymentStub()
+    return _payment_provider
 
-# ================= BOOKING FUNCTIONS ==========================
+def set_payment_provider(provider):
+    """Plug in another PaymentProvider"""
+    global _payment_provider
+    _payment_provider = provider
+
+def process_payment(amount, reference=""):
+    """Charge amount and wait for the result, returns the result dict"""
+    print("\nProcessing payment...")
+    future = get_payment_provider().charge(amount, reference)
+    return future.result()
+
+def process_refund(amount, reference):
+    """Refund amount and wait for the result, returns the result dict"""
+    print("\nProcessing refund...")
+    return get_payment_provider().refund(amount, reference).result()
+
+def benchmark_payments(count=200, latency=0.05, workers=PAYMENT_WORKERS):
+    """Measure payment throughput of the stub: sequential vs concurrent"""
+    provider = LocalPaymentStub(latency=latency, failure_rate=0.1, workers=workers)
+    
+    start = time.perf_counter()
+    for i in range(count // 10):  # sequential is slow, so time a tenth of it
+        provider.charge(1.0, f"seq{i}").result()
+    sequential = (count // 10) / (time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    futures = [provider.charge(1.0, f"con{i}") for i in range(count)]
+    approved = sum(1 for future in futures if future.result()['ok'])
+    concurrent = count / (time.perf_counter() - start)
+    provider.executor.shutdown()
+    
+    print(f"Payments: {count}, latency {latency*1000:.0f} ms, {workers} workers")
+    print(f"Sequential: {sequential:8.1f} payments/s")
+    print(f"Concurrent: {concurrent:8.1f} payments/s ({approved} approved)")
+    return sequential, concurrent
 
-def add_user_booking(bookings, username, event_id, seat_label, ticket_id):
-    """Add a booking for a user"""
-    if username not in bookings:
-        bookings[username] = []
+# ================= ADMISSION CONTROL ==========================
+# At on-sale time many buyers pick the same event at once. Each event has a
+# virtual waiting room in front of seat selection and checkout: buyers get a
+# queue number and are let in first come first served, no faster than its
+# token bucket allows and only while fewer than MAX_CHECKOUTS are inside.
+# The queue, the bucket and the checkouts inside are rows of ADMISSION_DB,
+# so the limits hold for all terminals together. Only the person at the
+# front of the queue takes the write lock to wait on the bucket; everyone
+# else just reads their place now and then. The seat holds of the checkouts
+# are kept in ADMISSION_DB too (see SEAT HOLDS).
+
+ADMISSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    number INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id TEXT NOT NULL,
+    state TEXT NOT NULL,  -- 'waiting', 'inside' or 'done'
+    joined REAL NOT NULL,
+    seen REAL NOT NULL,   -- last check of a waiter, or when it was let in
+    waited REAL
+);
+CREATE INDEX IF NOT EXISTS idx_queue_event ON queue(event_id, state, number);
+
+CREATE TABLE IF NOT EXISTS buckets (
+    event_id TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS holds (
+    event_id TEXT NOT NULL,
+    row_idx INTEGER NOT NULL,
+    seat_idx INTEGER NOT NULL,
+    hold_id TEXT NOT NULL,
+    username TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (event_id, row_idx, seat_idx)
+);
+CREATE INDEX IF NOT EXISTS idx_holds_id ON holds(hold_id);
+
+CREATE TABLE IF NOT EXISTS room_stats (
+    event_id TEXT PRIMARY KEY,
+    admitted INTEGER NOT NULL DEFAULT 0,
+    timed_out INTEGER NOT NULL DEFAULT 0,
+    max_depth INTEGER NOT NULL DEFAULT 0,
+    total_wait REAL NOT NULL DEFAULT 0,
+    max_wait REAL NOT NULL DEFAULT 0
+);
+"""
+
+RECENT_WAITS = 1000  # finished checkouts kept per event for the wait metrics
+
+_admission = {'pid': None, 'db': None}
+_admission_lock = threading.Lock()  # the threads of a process share one connection
+
+def admission_db():
+    """Open ADMISSION_DB (once per process), call it holding _admission_lock"""
+    if _admission['pid'] != os.getpid():
+        db = sqlite3.connect(ADMISSION_DB, timeout=30, isolation_level=None, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")  # readers don't wait for the front's writes
+        db.executescript(ADMISSION_SCHEMA)
+        _admission.update(pid=os.getpid(), db=db)
+    return _admission['db']
+
+class TokenBucket:
+    """rate tokens per second, up to burst of them saved up
+    (the waiting room keeps tokens/updated in ADMISSION_DB)"""
+    
+    def __init__(self, rate, burst, tokens=None, updated=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst if tokens is None else tokens
+        self.updated = time.time() if updated is None else updated
+    
+    def refill(self):
+        now = time.time()  # wall clock, the buckets are shared between processes
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+    
+    def try_take(self):
+        """Take a token if there is one"""
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
     
-    bookings[username].append({
-        'ticket_id': ticket_id,
-        'event_id': event_id,
-        'seat': seat_label,
-        'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    })
+    def wait_time(self):
+        """Seconds until the next token is there"""
+        self.refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+class WaitingRoom:
+    """Virtual queue in front of the checkouts of one event"""
+    
+    def __init__(self, event_id, rate=ADMISSION_RATE, burst=ADMISSION_BURST, max_checkouts=MAX_CHECKOUTS):
+        self.event_id = event_id
+        self.rate = rate
+        self.burst = burst
+        self.max_checkouts = max_checkouts
+        self.inside = []  # queue numbers this process let in that haven't left yet
+    
+    def enter(self, timeout=None, on_wait=None):
+        """Queue up and wait to be let in
+        on_wait(position) is called while waiting (1 = next in line)
+        returns the queue number, or None if timeout ran out first"""
+        start = time.time()
+        with _admission_lock:
+            db = admission_db()
+            with db:
+                db.execute("BEGIN IMMEDIATE")
+                number = db.execute("INSERT INTO queue (event_id, state, joined, seen) VALUES (?, 'waiting', ?, ?)",
+                                    (self.event_id, start, start)).lastrowid
+                db.execute("INSERT OR IGNORE INTO room_stats (event_id) VALUES (?)", (self.event_id,))
+                db.execute("UPDATE room_stats SET max_depth = MAX(max_depth, (SELECT COUNT(*) FROM queue "
+                           "WHERE event_id = ? AND state = 'waiting')) WHERE event_id = ?",
+                           (self.event_id, self.event_id))
+        
+        seen = start
+        while True:
+            now = time.time()
+            position = self.position(number, now)
+            timed_out = timeout is not None and now - start >= timeout
+            if position == 1 or timed_out or now - seen >= QUEUE_STALE_SECONDS / 3:
+                admitted, sleep = self.take_turn(number, start, now, timed_out)
+                if admitted is not None:
+                    return number if admitted else None
+                seen = now
+            else:
+                sleep = (position - 1) / self.rate  # can't be at the front before then
+            
+            if on_wait:
+                on_wait(position)
+            if timeout is not None:
+                sleep = min(sleep, start + timeout - now)
+            time.sleep(min(max(sleep, 0.005), 0.5))  # look again, others may have left the queue
+    
+    def position(self, number, now):
+        """Our place in the queue (1 = next in line), not counting waiters that went away"""
+        with _admission_lock:
+            return admission_db().execute(
+                "SELECT COUNT(*) FROM queue WHERE event_id = ? AND state = 'waiting' "
+                "AND number < ? AND seen >= ?", (self.event_id, number, now - QUEUE_STALE_SECONDS)).fetchone()[0] + 1
+    
+    def take_turn(self, number, start, now, timed_out):
+        """Let us in if we are at the front and a token and a checkout are free
+        returns (True, 0) if let in, (False, 0) if we gave up, else (None, seconds to wait)"""
+        with _admission_lock:
+            db = admission_db()
+            with db:
+                db.execute("BEGIN IMMEDIATE")
+                # forget waiters that went away and checkouts that never left
+                db.execute("DELETE FROM queue WHERE event_id = ? AND state = 'waiting' AND seen < ?",
+                           (self.event_id, now - QUEUE_STALE_SECONDS))
+                db.execute("UPDATE queue SET state = 'done' WHERE event_id = ? AND state = 'inside' AND seen < ?",
+                           (self.event_id, now - CHECKOUT_STALE_SECONDS))
+                if timed_out:
+                    db.execute("DELETE FROM queue WHERE number = ?", (number,))
+                    db.execute("UPDATE room_stats SET timed_out = timed_out + 1 WHERE event_id = ?", (self.event_id,))
+                    return False, 0
+                
+                if not db.execute("UPDATE queue SET seen = ? WHERE number = ?", (now, number)).rowcount:
+                    # dropped while this process was stalled, take the same place again
+                    db.execute("INSERT INTO queue (number, event_id, state, joined, seen) VALUES (?, ?, 'waiting', ?, ?)",
+                               (number, self.event_id, start, now))
+                front = db.execute("SELECT MIN(number) FROM queue WHERE event_id = ? AND state = 'waiting'",
+                                   (self.event_id,)).fetchone()[0]
+                active = db.execute("SELECT COUNT(*) FROM queue WHERE event_id = ? AND state = 'inside'",
+                                    (self.event_id,)).fetchone()[0]
+                if front != number:
+                    return None, 0
+                if active >= self.max_checkouts:
+                    return None, 0.05  # wait for a checkout to finish
+                
+                row = db.execute("SELECT tokens, updated FROM buckets WHERE event_id = ?", (self.event_id,)).fetchone()
+                bucket = TokenBucket(self.rate, self.burst, *(row or ()))
+                taken = bucket.try_take()
+                db.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                           (self.event_id, bucket.tokens, bucket.updated))
+                if not taken:
+                    return None, bucket.wait_time()
+                
+                waited = now - start
+                db.execute("UPDATE queue SET state = 'inside', seen = ?, waited = ? WHERE number = ?",
+                           (now, waited, number))
+                db.execute("UPDATE room_stats SET admitted = admitted + 1, total_wait = total_wait + ?, "
+                           "max_wait = MAX(max_wait, ?) WHERE event_id = ?", (waited, waited, self.event_id))
+            self.inside.append(number)
+        return True, 0
+    
+    def leave(self):
+        """A checkout that was let in has finished"""
+        with _admission_lock:
+            number = self.inside.pop()
+            db = admission_db()
+            db.execute("UPDATE queue SET state = 'done' WHERE number = ?", (number,))
+            # only the recent waits are kept for the metrics
+            db.execute("DELETE FROM queue WHERE event_id = ? AND state = 'done' AND number <= "
+                       "(SELECT number FROM queue WHERE event_id = ? AND state = 'done' "
+                       "ORDER BY number DESC LIMIT 1 OFFSET ?)", (self.event_id, self.event_id, RECENT_WAITS))
+    
+    def stats(self):
+        """Queue depth, checkouts running and wait times"""
+        now = time.time()
+        with _admission_lock:
+            db = admission_db()
+            row = db.execute("SELECT * FROM room_stats WHERE event_id = ?", (self.event_id,)).fetchone()
+            stats = dict(row) if row else {'admitted': 0, 'timed_out': 0, 'max_depth': 0,
+                                           'total_wait': 0.0, 'max_wait': 0.0}
+            stats.pop('event_id', None)
+            stats['depth'] = db.execute("SELECT COUNT(*) FROM queue WHERE event_id = ? AND state = 'waiting' "
+                                        "AND seen >= ?", (self.event_id, now - QUEUE_STALE_SECONDS)).fetchone()[0]
+            stats['active'] = db.execute("SELECT COUNT(*) FROM queue WHERE event_id = ? AND state = 'inside' "
+                                         "AND seen >= ?", (self.event_id, now - CHECKOUT_STALE_SECONDS)).fetchone()[0]
+            waits = [r['waited'] for r in db.execute("SELECT waited FROM queue WHERE event_id = ? "
+                                                      "AND waited IS NOT NULL ORDER BY waited", (self.event_id,))]
+        admitted = stats['admitted']
+        stats['avg_wait'] = stats.pop('total_wait') / admitted if admitted else 0.0
+        stats['p95_wait'] = waits[int(len(waits) * 0.95)] if waits else 0.0
+        return stats
+    
+    def reset(self):
+        """Forget the queue, bucket and metrics of this room"""
+        with _admission_lock:
+            db = admission_db()
+            with db:
+                db.execute("BEGIN IMMEDIATE")
+                for table in ('queue', 'buckets', 'room_stats'):
+                    db.execute(f"DELETE FROM {table} WHERE event_id = ?", (self.event_id,))
+            self.inside.clear()
+
+_waiting_rooms = {}  # event_id -> WaitingRoom
+_waiting_rooms_lock = threading.Lock()
+
+def get_waiting_room(event_id):
+    """Get the waiting room of an event"""
+    with _waiting_rooms_lock:
+        if event_id not in _waiting_rooms:
+            _waiting_rooms[event_id] = WaitingRoom(event_id)
+        return _waiting_rooms[event_id]
+
+def admission_stats():
+    """Get event id -> waiting room metrics (see WaitingRoom.stats) of every terminal"""
+    if not os.path.exists(ADMISSION_DB):
+        return {}
+    with _admission_lock:
+        event_ids = [r['event_id'] for r in admission_db().execute("SELECT event_id FROM room_stats")]
+    return {event_id: get_waiting_room(event_id).stats() for event_id in event_ids}
+
+def benchmark_admission(buyers=1000, rate=200, burst=20, max_checkouts=20, checkout_time=0.05):
+    """Simulate an on-sale rush: buyers arrive at once and each checkout takes checkout_time"""
+    room = WaitingRoom(f"benchmark-{os.getpid()}", rate=rate, burst=burst, max_checkouts=max_checkouts)
+    
+    def buyer():
+        if room.enter() is not None:
+            time.sleep(checkout_time)
+            room.leave()
+    
+    start = time.perf_counter()
+    threads = [threading.Thread(target=buyer) for _ in range(buyers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    stats = room.stats()
+    room.reset()  # keep it out of the admin statistics
+    print(f"Buyers: {buyers}, rate {rate}/s, burst {burst}, {max_checkouts} checkouts at once")
+    print(f"Admitted: {stats['admitted']} in {elapsed:.1f} s ({stats['admitted'] / elapsed:.1f}/s)")
+    print(f"Max queue depth: {stats['max_depth']}")
+    print(f"Wait: avg {stats['avg_wait']:.2f} s, p95 {stats['p95_wait']:.2f} s, max {stats['max_wait']:.2f} s")
+    return stats
 
 # ========= AUTHENTICATION ===================
 
@@ -292,7 +3118,7 @@ def browse_events(is_guest=False):
     clear_screen()
     print_header("AVAILABLE EVENTS")
     
-    events = load_events()
+    events = get_event_summaries()
     
     if not events:
         print("\n❌ No events available at the moment.")
@@ -300,17 +3126,14 @@ def browse_events(is_guest=False):
         return
     
     for event_id, event in events.items():
-        available_seats = get_available_seats(event)
-        total_seats = get_total_seats(event)
-        
         print(f"\n{'─'*60}")
         print(f"Event ID: {event['event_id']}")
         print(f"Name: {event['name']}")
         print(f"Date: {event['date']}")
         print(f"Location: {event['location']}")
         print(f"Price: {event['price']}")
-        print(f"Seats Available: {available_seats}/{total_seats}")
-        print(f"Vendor Slots Available: {get_available_vendor_slots(event)}/{event['total_vendor_slots']}")
+        print(f"Seats Available: {event['available_seats']}/{event['total_seats']}")
+        print(f"Vendor Slots Available: {event['available_vendor_slots']}/{event['total_vendor_slots']}")
     
     print(f"\n{'─'*60}")
     
@@ -324,7 +3147,7 @@ def view_event_details(is_guest=False):
     clear_screen()
     print_header("EVENT DETAILS")
     
-    events = load_events()
+    events = get_event_summaries()
     
     if not events:
         print("\n❌ No events available.")
@@ -342,7 +3165,7 @@ def view_event_details(is_guest=False):
         pause()
         return None
     
-    event = events[event_id] # gets a;; the info of the event 
+    event = load_event(event_id) # gets all the info of the event (seat map only loads now)
     
     clear_screen()
     print_header(f"EVENT: {event['name']}")
@@ -403,10 +3226,15 @@ def user_dashboard(username):
         clear_screen()
         print_header(f"USER DASHBOARD - {users[username]['name']}") # prints the name of the user from user.json
         # print_header is defined by us to print the whole style of the header 
+        for event_id, offer in get_user_offers(username):
+            print(f"\n🎟️  Waitlist: seat {seat_label(*offer['seat'])} of {event_id} is held for you until "
+                  f"{datetime.fromtimestamp(offer['expires']).strftime('%H:%M')} (Book Ticket)")
         print("\n1. Browse Events")
         print("2. Book Ticket")
-        print("3. My Bookings")
-        print("4. Logout")
+        print("3. Find Best Seats (Group)")
+        print("4. My Bookings")
+        print("5. Cancel Booking")
+        print("6. Logout")
         
         choice = input("\nChoice: ").strip()
         
@@ -415,8 +3243,12 @@ def user_dashboard(username):
         elif choice == '2':
             book_ticket(username)
         elif choice == '3':
-            view_my_bookings(username)
+            find_group_seats(username)
         elif choice == '4':
+            view_my_bookings(username)
+        elif choice == '5':
+            cancel_booking(username)
+        elif choice == '6':
             print("\n👋 Logged out successfully!")
             pause()
             break
@@ -431,119 +3263,269 @@ def book_ticket(username):
     if not event_id:
         return None 
     
-    events = load_events()
-    event = events[event_id]
+    if not enter_waiting_room(event_id):
+        return None
+    try:
+        select_seat(username, event_id)
+    finally:
+        get_waiting_room(event_id).leave()
+
+def enter_waiting_room(event_id):
+    """Wait for our turn to book seats of an event, showing the queue position
+    returns False if the wait timed out"""
+    shown = []
+    
+    def on_wait(position):
+        if not shown or shown[-1] != position:
+            print(f"\r⏳ High demand - you are number {position} in the queue...  ", end="", flush=True)
+            shown.append(position)
+    
+    admitted = get_waiting_room(event_id).enter(timeout=ADMISSION_TIMEOUT, on_wait=on_wait)
+    if shown:
+        print()
+    if admitted is None:
+        print("\n❌ The queue is taking too long, please try again later.")
+        pause()
+        return False
+    return True
+
+def select_seat(username, event_id):
+    """Pick seats of an event and check out (after the waiting room)"""
+    event = load_event(event_id)
     
-    if get_available_seats(event) == 0:
+    if get_available_seats(event) - len(held_seats(event_id, exclude_user=username)) <= 0:
         print("\n❌ Sorry, event is fully booked!")
+        join = input("Join the waitlist? (yes/no): ").strip().lower()
+        if join == 'yes':
+            success, result = join_waitlist(event_id, username)
+            if success:
+                print(f"\n✅ You are on the waitlist ({result} waiting).")
+                print("If a seat frees up it will be held for you.")
+            else:
+                print(f"\n❌ {result}")
         pause()
         return None 
     
+    offer = waitlist_offers(event_id).get(username)
+    
     print("\n" + "─"*60)
     print("SEAT MAP")
     print("─"*60)
-    display_seat_map(event)
+    if offer:
+        display_seat_map(event, [tuple(offer['seat'])])
+        print(f"Seat {seat_label(*offer['seat'])} is held for you until "
+              f"{datetime.fromtimestamp(offer['expires']).strftime('%H:%M')}")
+    else:
+        display_seat_map(event)
     
-    seat_input = input("Enter seat (e.g., 5B): ").strip().upper()
+    my_seats = get_user_event_seats(username, event_id)
+    if my_seats:
+        print(f"Your seats: {', '.join(my_seats)}")
     
-    # Parse seat input
-    row_str = ""
-    seat_letter = ""
-    for char in seat_input:
-        if char.isdigit():
-            row_str += char
-        elif char.isalpha():
-            seat_letter += char
+    seat_input = input("Enter seats (e.g., 5B or 5B,5C,7A): ").strip().upper()
     
-    if not row_str or not seat_letter:
+    # Parse seat input, one label per comma
+    seats = [parse_seat_label(label.replace(" ", "")) for label in seat_input.split(",")]
+    if None in seats:
         print("\n❌ Invalid seat format!")
         pause()
         return
     
-    row = int(row_str) - 1
-    seat = ord(seat_letter) - 65 # ord converts the letter to its ASCI or unicode 
-    
-    # Book the seat
-    success, message = book_seat(event, row, seat, username)
+    # Hold the seats while the user pays, then book them all at once
+    success, message = place_hold(event, seats, username)
     
     if not success:
         print(f"\n❌ {message}")
         pause()
         return
     
+    checkout(username, event_id, event, message)
+
+def checkout(username, event_id, event, hold_id):
+    """Take payment for held seats and save the booking in one go
+    the hold is dropped if payment is declined or fails"""
+    seats = get_hold(hold_id)['seats']
+    labels = [seat_label(row, seat) for row, seat in seats]
+    
     # Payment simulation
     print("\n" + "─"*60)
     print("PAYMENT")
     print("─"*60)
     print(f"Event: {event['name']}")
-    print(f"Seat: {message}")
-    print(f"Price: {event['price']}")
+    print(f"Seat: {', '.join(labels)}")
+    print(f"Price: {event['price'] * len(seats)}")
     
     confirm = input("\nProceed to payment? (yes/no): ").strip().lower()
     
     if confirm != 'yes':
-        # Cancel the booking
-        cancel_seat(event, row, seat)
-        save_events(events)
+        # Cancel the booking (nothing was written, the hold just goes away)
+        release_hold(hold_id)
         print("\n❌ Booking cancelled!")
         pause()
         return
     
-    # Simulate payment
-    print("\nProcessing payment...")
-    import time
-    time.sleep(2)
+    if not get_hold(hold_id):
+        print(f"\n❌ Your seats were only held for {HOLD_SECONDS // 60} minutes, please try again.")
+        pause()
+        return
     
-    # Random payment success (90% success rate for simulation)
-    if random.random() < 0.9:
-        ticket_id = f"TKT{random.randint(10000, 99999)}"
-        
-        # Save booking
-        bookings = load_bookings()
-        add_user_booking(bookings, username, event_id, message, ticket_id)
-        save_bookings(bookings)
-        save_events(events)
-        
-        print("\n✅ Payment successful!")
-        print(f"Ticket ID: {ticket_id}")
-        print(f"Seat: {message}")
-        print("\n🎉 Booking confirmed!")
-    else:
+    payment = process_payment(event['price'] * len(seats), f"{event_id}:{','.join(labels)}")
+    if not payment['ok']:
         # Payment failed - cancel booking
-        cancel_seat(event, row, seat)
-        save_events(events)
-        print("\n❌ Payment failed! Please try again.")
+        release_hold(hold_id)
+        print(f"\n❌ Payment failed ({payment['reason']})! Please try again.")
+        pause()
+        return
+    
+    # the seats and their tickets are only booked now
+    release_hold(hold_id)
+    success, record = book_seats(event, seats, username, payment['amount'] / len(seats))
+    if not success:
+        print(f"\n❌ {record}!")
+        # the payment already went through, give it back
+        refund = process_refund(payment['amount'], payment['payment_id'])
+        if refund['ok']:
+            print(f"Your payment of {payment['amount']} was refunded (Refund ID: {refund['refund_id']}).")
+        else:
+            print(f"Refund failed ({refund['reason']}), please contact support with "
+                  f"Payment ID {payment['payment_id']}.")
+        pause()
+        return
+    
+    offer = waitlist_offers(event_id).get(username)
+    if offer:
+        # off the waitlist; if they took other seats the offered one moves on
+        leave_waitlist(event_id, username)
+        promote_waitlist(event_id, [tuple(offer['seat'])])
     
+    ticket_ids, group_id = record['tickets'], record.get('group_id')
+    print("\n✅ Payment successful!")
+    for ticket_id, label in zip(ticket_ids, labels):
+        print(f"Ticket ID: {ticket_id}")
+        print(f"Seat: {label}")
+        print(f"Ticket Code: {ticket_code(event_id, label, ticket_id)}")
+    if group_id:
+        print(f"Group: {group_id}")
+    print("\n🎉 Booking confirmed!")
     pause()
 
+def find_group_seats(username):
+    """Find the best block of adjacent seats for a group"""
+    event_id = view_event_details()
+    
+    if not event_id:
+        return None
+    
+    if not enter_waiting_room(event_id):
+        return None
+    try:
+        select_group_seats(username, event_id)
+    finally:
+        get_waiting_room(event_id).leave()
+
+def select_group_seats(username, event_id):
+    """Suggest the best block of seats and check out (after the waiting room)"""
+    event = load_event(event_id)
+    
+    try:
+        count = int(input("\nHow many seats together? ").strip())
+    except ValueError:
+        print("\n❌ Invalid number!")
+        pause()
+        return
+    
+    seats = find_best_seats(event, count)
+    
+    if not seats:
+        print(f"\n❌ Sorry, there are no {count} adjacent seats available!")
+        pause()
+        return
+    
+    print("\n" + "─"*60)
+    print("BEST AVAILABLE SEATS")
+    print("─"*60)
+    display_seat_map(event, seats)
+    
+    labels = [seat_label(row, seat) for row, seat in seats]
+    print(f"Seats: {', '.join(labels)}")
+    print(f"Total: {count * event['price']}")
+    
+    confirm = input("\nBook these seats? (yes/no): ").strip().lower()
+    if confirm != 'yes':
+        return
+    
+    success, message = place_hold(event, seats, username)
+    if not success:
+        print(f"\n❌ {message}")
+        pause()
+        return
+    
+    checkout(username, event_id, event, message)
+
 def view_my_bookings(username):
     """View user's bookings"""
     clear_screen()
     print_header("MY BOOKINGS")
     
-    bookings = load_bookings()
-    events = load_events()
+    user_bookings = get_user_tickets(username)
     
-    if username not in bookings or not bookings[username]:
+    if not user_bookings:
         print("\n❌ No bookings found.")
         pause()
         return
     
-    user_bookings = bookings[username]
-    
     for booking in user_bookings:
-        event = events.get(booking['event_id'])
-        if event:
-            print(f"\n{'─'*60}")
-            print(f"Ticket ID: {booking['ticket_id']}")
-            print(f"Event: {event['name']}")
-            print(f"Date: {event['date']}")
-            print(f"Seat: {booking['seat']}")
-            print(f"Booked: {booking['time']}")
+        print(f"\n{'─'*60}")
+        print(f"Ticket ID: {booking['ticket_id']}")
+        print(f"Event: {booking['event_name']}")
+        print(f"Date: {booking['event_date']}")
+        print(f"Seat: {booking['seat']}")
+        print(f"Booked: {booking['time']}")
+        print(f"Ticket Code: {ticket_code(booking['event_id'], booking['seat'], booking['ticket_id'])}")
     
     print(f"\n{'─'*60}")
     pause()
 
+def cancel_booking(username):
+    """Cancel one of the user's tickets and get a refund"""
+    clear_screen()
+    print_header("CANCEL BOOKING")
+    
+    event_id = input("Event ID: ").strip()
+    my_seats = get_user_event_seats(username, event_id)
+    
+    if not my_seats:
+        print("\n❌ You have no bookings for this event.")
+        pause()
+        return
+    
+    for label, ticket_id in my_seats.items():
+        print(f"  Seat {label} - Ticket ID: {ticket_id}")
+    
+    label = input("\nSeat to cancel (e.g., 5B): ").strip().upper()
+    if label not in my_seats:
+        print("\n❌ That is not one of your seats!")
+        pause()
+        return
+    
+    confirm = input(f"Cancel seat {label} and get a refund? (yes/no): ").strip().lower()
+    if confirm != 'yes':
+        print("\n❌ Cancellation aborted!")
+        pause()
+        return
+    
+    success, result = cancel_ticket(username, event_id, label)
+    if success:
+        print(f"\n✅ Seat {label} cancelled!")
+        if result['ok']:
+            print(f"Refund: {result['amount']} (Refund ID: {result['refund_id']})")
+        else:
+            print(f"Refund failed ({result['reason']}), it is still owed to you. "
+                  f"Please contact support with Ticket ID {my_seats[label]}.")
+    else:
+        print(f"\n❌ {result}")
+    pause()
+
 # =============== VENDOR MODULE ====================
 
 def vendor_dashboard(username):
@@ -580,7 +3562,7 @@ def view_vendor_events():
     clear_screen()
     print_header("EVENTS - STALL AVAILABILITY")
     
-    events = load_events()
+    events = get_event_summaries()
     
     if not events:
         print("\n❌ No events available.")
@@ -588,7 +3570,7 @@ def view_vendor_events():
         return
     
     for event_id, event in events.items():
-        available = get_available_vendor_slots(event)
+        available = event['available_vendor_slots']
         
         print(f"\n{'─'*60}")
         print(f"Event ID: {event['event_id']}")
@@ -605,7 +3587,7 @@ def apply_for_stall(username):
     clear_screen()
     print_header("APPLY FOR STALL")
     
-    events = load_events()
+    events = get_event_summaries()
     
     if not events:
         print("\n❌ No events available.")
@@ -614,7 +3596,7 @@ def apply_for_stall(username):
     
     # Show events
     for event_id, event in events.items():
-        available = get_available_vendor_slots(event)
+        available = event['available_vendor_slots']
         print(f"{event_id}. {event['name']} - {available} stalls available")
     
     event_id = input("\nEnter Event ID: ").strip()
@@ -624,7 +3606,7 @@ def apply_for_stall(username):
         pause()
         return
     
-    event = events[event_id]
+    event = load_event(event_id)
     
     # Check if already applied
     if username in event['vendor_bookings']:
@@ -642,6 +3624,7 @@ def apply_for_stall(username):
     print(f"\nEvent: {event['name']}")
     print(f"Date: {event['date']}")
     print(f"Location: {event['location']}")
+    display_stall_map(event)
     
     business_name = input("\nBusiness Name: ").strip()
     business_type = input("Business Type: ").strip()
@@ -650,16 +3633,22 @@ def apply_for_stall(username):
     confirm = input("\nSubmit application? (yes/no): ").strip().lower()
     
     if confirm == 'yes' or 'y':
-        event['vendor_bookings'][username] = {
+        application = {
             'status': 'pending',
             'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             'business_name': business_name,
             'business_type': business_type,
             'description': description
         }
-        save_events(events)
-        
-        print("\n✅ Application submitted! Wait for admin approval.")
+        if append_journal({
+            'op': 'vendor_apply',
+            'event_id': event_id,
+            'vendor': username,
+            'application': application
+        }):
+            print("\n✅ Application submitted! Wait for admin approval.")
+        else:
+            print("\n❌ Could not submit the application, the event may have been deleted.")
     else:
         print("\n❌ Application cancelled.")
     
@@ -670,15 +3659,7 @@ def view_vendor_applications(username):
     clear_screen()
     print_header("MY APPLICATIONS")
     
-    events = load_events()
-    applications = []
-    
-    for event_id, event in events.items():
-        if username in event['vendor_bookings']:
-            applications.append({
-                'event': event,
-                'application': event['vendor_bookings'][username]
-            })
+    applications = get_vendor_applications(username)
     
     if not applications:
         print("\n❌ No applications found.")
@@ -686,14 +3667,15 @@ def view_vendor_applications(username):
         return
     
     for app in applications:
-        event = app['event']
         data = app['application']
         
         print(f"\n{'─'*60}")
-        print(f"Event: {event['name']}")
-        print(f"Date: {event['date']}")
+        print(f"Event: {app['event_name']}")
+        print(f"Date: {app['event_date']}")
         print(f"Business: {data['business_name']}")
         print(f"Status: {data['status'].upper()}")
+        if data.get('stall'):
+            print(f"Stall: {data['stall']}")
         print(f"Applied: {data['time']}")
         
         if 'message' in data:
@@ -719,7 +3701,9 @@ def admin_dashboard(username):
         print("5. View Bookings")
         print("6. Review Vendor Applications")
         print("7. Statistics")
-        print("8. Logout")
+        print("8. Gate Check-in (Scan)")
+        print("9. Owed Refunds")
+        print("10. Logout")
         
         choice = input("\nChoice: ").strip()
         
@@ -738,6 +3722,10 @@ def admin_dashboard(username):
         elif choice == '7':
             view_statistics()
         elif choice == '8':
+            gate_check_in()
+        elif choice == '9':
+            pay_owed_refunds()
+        elif choice == '10':
             print("\n👋 Logged out successfully!")
             pause()
             break
@@ -750,11 +3738,9 @@ def create_event_admin():
     clear_screen()
     print_header("CREATE EVENT")
     
-    events = load_events()
-    
     event_id = input("Event ID: ").strip()
     
-    if event_id in events:
+    if event_id in get_event_summaries():
         print("\n❌ Event ID already exists!")
         pause()
         return
@@ -772,8 +3758,7 @@ def create_event_admin():
     
     event = create_event(event_id, name, date, location, price, rows, seats_per_row, vendor_slots, description)
     
-    events[event_id] = event
-    save_events(events)
+    save_events({event_id: event})
     
     print("\n✅ Event created successfully!")
     pause()
@@ -783,7 +3768,7 @@ def view_all_events_admin():
     clear_screen()
     print_header("ALL EVENTS")
     
-    events = load_events()
+    events = get_event_summaries()
     
     if not events:
         print("\n❌ No events created yet.")
@@ -791,8 +3776,9 @@ def view_all_events_admin():
         return
     
     for event_id, event in events.items():
-        total_seats = get_total_seats(event)
-        booked_seats = total_seats - get_available_seats(event)
+        total_seats = event['total_seats']
+        booked_seats = total_seats - event['available_seats']
+        approved = event['total_vendor_slots'] - event['available_vendor_slots']
         
         print(f"\n{'─'*60}")
         print(f"ID: {event['event_id']}")
@@ -801,7 +3787,7 @@ def view_all_events_admin():
         print(f"Location: {event['location']}")
         print(f"Price: {event['price']}")
         print(f"Seats: {booked_seats}/{total_seats} booked")
-        print(f"Vendors: {len([v for v in event['vendor_bookings'].values() if v['status']=='approved'])}/{event['total_vendor_slots']} approved")
+        print(f"Vendors: {approved}/{event['total_vendor_slots']} approved")
     
     print(f"\n{'─'*60}")
     pause()
@@ -811,7 +3797,7 @@ def edit_event():
     clear_screen()
     print_header("EDIT EVENT")
     
-    events = load_events()
+    events = get_event_summaries()
     
     if not events:
         print("\n❌ No events to edit.")
@@ -823,13 +3809,12 @@ def edit_event():
     
     event_id = input("\nEnter Event ID to edit: ").strip()
     
-    if event_id not in events:
+    event = load_event(event_id) if event_id in events else None
+    if event is None:
         print("\n❌ Event not found!")
         pause()
         return
     
-    event = events[event_id]
-    
     print(f"\nEditing: {event['name']}")
     print("\n1. Change Name")
     print("2. Change Date")
@@ -849,7 +3834,12 @@ def edit_event():
     elif choice == '4':
         event['price'] = float(input("New Price: ").strip())
     elif choice == '5':
-        event['total_vendor_slots'] = int(input("New Vendor Slots: ").strip())
+        slots = int(input("New Vendor Slots: ").strip())
+        if slots < event['vendor_counts']['approved']:
+            print(f"\n❌ {event['vendor_counts']['approved']} vendors are already approved!")
+            pause()
+            return
+        event['total_vendor_slots'] = slots
     elif choice == '6':
         return
     else:
@@ -857,8 +3847,10 @@ def edit_event():
         pause()
         return
     
-    save_events(events)
-    print("\n✅ Event updated successfully!")
+    if save_events({event_id: event}):
+        print("\n✅ Event updated successfully!")
+    else:
+        print("\n❌ Could not save the change, the event may have been deleted.")
     pause()
 
 def delete_event():
@@ -866,7 +3858,7 @@ def delete_event():
     clear_screen()
     print_header("DELETE EVENT")
     
-    events = load_events()
+    events = get_event_summaries()
     
     if not events:
         print("\n❌ No events to delete alr.")
@@ -888,8 +3880,7 @@ def delete_event():
     confirm = input(f"\nDelete '{event['name']}'? (yes/no): ").strip().lower()
     
     if confirm == 'yes' or 'y':
-        del events[event_id]
-        save_events(events)
+        remove_event(event_id)
         print("\n✅ Event deleted successfully!")
     else:
         print("\n❌ Deletion cancelled.")
@@ -901,20 +3892,16 @@ def view_all_bookings():
     clear_screen()
     print_header("ALL BOOKINGS")
     
-    events = load_events()
     total_bookings = 0
     
-    for event_id, event in events.items():
-        bookings = event['bookings']
+    for event_name, bookings in get_all_seat_bookings():
+        print(f"\n{'─'*60}")
+        print(f"Event: {event_name}")
+        print(f"{'─'*60}")
         
-        if bookings:
-            print(f"\n{'─'*60}")
-            print(f"Event: {event['name']}")
-            print(f"{'─'*60}")
-            
-            for seat, info in bookings.items():
-                print(f"Seat {seat} - User: {info['user']} - Time: {info['time']}")
-                total_bookings += 1
+        for seat, info in bookings.items():
+            print(f"Seat {seat} - User: {info['user']} - Ticket: {info.get('ticket_id') or '-'} - Time: {info['time']}")
+            total_bookings += 1
     
     if total_bookings == 0:
         print("\n❌ No bookings yet.")
@@ -924,99 +3911,275 @@ def view_all_bookings():
     
     pause()
 
-def review_vendor_applications():
-    """Review and approve/reject vendor applications"""
+def pay_owed_refunds():
+    """List the refunds of cancelled tickets that are still owed and pay them"""
     clear_screen()
-    print_header("VENDOR APPLICATIONS")
-    
-    events = load_events()
-    pending_apps = []
+    print_header("OWED REFUNDS")
     
-    # Collect all pending applications
-    for event_id, event in events.items():
-        for vendor_username, app in event['vendor_bookings'].items():
-            if app['status'] == 'pending':
-                pending_apps.append({
-                    'event_id': event_id,
-                    'event': event,
-                    'vendor': vendor_username,
-                    'app': app
-                })
-    
-    if not pending_apps:
-        print("\n❌ No pending applications.")
+    owed = get_owed_refunds()
+    if not owed:
+        print("\n✅ No refunds are owed.")
         pause()
         return
     
-    # Display applications
-    for idx, item in enumerate(pending_apps, 1):
-        print(f"\n{'─'*60}")
-        print(f"Application #{idx}")
-        print(f"Event: {item['event']['name']}")
-        print(f"Vendor: {item['vendor']}")
-        print(f"Business: {item['app']['business_name']}")
-        print(f"Type: {item['app']['business_type']}")
-        print(f"Description: {item['app']['description']}")
-        print(f"Applied: {item['app']['time']}")
-    
-    print(f"\n{'─'*60}")
+    for event_id, ticket_id, refund in owed:
+        print(f"{event_id} - Seat {refund['seat']} - User: {refund['user']} - "
+              f"Ticket: {ticket_id} - Amount: {refund['amount']} - Cancelled: {refund['time']}")
     
-    app_num = input("\nSelect application # to review (0 to cancel): ").strip()
+    confirm = input(f"\nPay these {len(owed)} refunds now? (yes/no): ").strip().lower()
+    if confirm != 'yes':
+        pause()
+        return
     
-    try:
-        app_num = int(app_num)
+    for event_id, ticket_id, result in settle_owed_refunds():
+        if result['ok']:
+            print(f"✅ Ticket {ticket_id}: {result['amount']} refunded (Refund ID: {result['refund_id']})")
+        else:
+            print(f"❌ Ticket {ticket_id}: refund failed ({result['reason']}), still owed")
+    pause()
+
+def review_vendor_applications():
+    """Review and approve/reject vendor applications, a page at a time"""
+    offset = 0
+    while True:
+        clear_screen()
+        print_header("VENDOR APPLICATIONS")
+        
+        # One page of the pending applications, oldest first
+        total, pending_apps = get_pending_applications(offset)
+        
+        if not pending_apps and offset:
+            # the last page was reviewed, go back one
+            offset = max(0, offset - REVIEW_PAGE_SIZE)
+            continue
+        if not pending_apps:
+            print("\n❌ No pending applications.")
+            pause()
+            return
+        
+        # Display applications
+        for idx, item in enumerate(pending_apps, offset + 1):
+            print(f"\n{'─'*60}")
+            print(f"Application #{idx}")
+            print(f"Event: {item['event_name']}")
+            print(f"Vendor: {item['vendor']}")
+            print(f"Business: {item['app']['business_name']}")
+            print(f"Type: {item['app']['business_type']}")
+            print(f"Description: {item['app']['description']}")
+            print(f"Applied: {item['app']['time']}")
+        
+        print(f"\n{'─'*60}")
+        print(f"Showing {offset + 1}-{offset + len(pending_apps)} of {total} pending")
+        
+        app_num = input("\nSelect application # to review (n = next page, p = previous page, "
+                        "b = bulk approve/reject, 0 to go back): ").strip().lower()
+        
+        if app_num == 'b':
+            bulk_review_applications()
+            continue
+        if app_num == 'n':
+            if offset + REVIEW_PAGE_SIZE < total:
+                offset += REVIEW_PAGE_SIZE
+            continue
+        if app_num == 'p':
+            offset = max(0, offset - REVIEW_PAGE_SIZE)
+            continue
+        
+        try:
+            app_num = int(app_num)
+        except ValueError:
+            print("\n❌ Invalid input!")
+            pause()
+            continue
+        
         if app_num == 0:
             return
-        if 1 <= app_num and app_num <= len(pending_apps):
-            selected = pending_apps[app_num - 1]
-            
-            print("\n1. Approve")
-            print("2. Reject")
-            
-            decision = input("\nChoice: ").strip()
-            
-            if decision == '1':
-                selected['app']['status'] = 'approved'
-                message = input("Message to vendor (optional): ").strip()
-                if message:
-                    selected['app']['message'] = message
-                print("\n✅ Application approved!")
-            elif decision == '2':
-                selected['app']['status'] = 'rejected'
-                message = input("Rejection reason: ").strip()
-                selected['app']['message'] = message
-                print("\n✅ Application rejected!")
-            else:
-                print("\n❌ Invalid choice!")
-                pause()
-                return
-            
-            save_events(events)
+        if not offset < app_num <= offset + len(pending_apps):
+            print("\n❌ Invalid application number!")
             pause()
+            continue
+        
+        selected = pending_apps[app_num - offset - 1]
+        
+        print("\n1. Approve")
+        print("2. Reject")
+        
+        decision = input("\nChoice: ").strip()
+        
+        record = {
+            'op': 'vendor_status',
+            'event_id': selected['event_id'],
+            'vendor': selected['vendor']
+        }
+        
+        if decision == '1':
+            event = load_event(selected['event_id'])
+            display_stall_map(event)
+            stall = input("Stall (e.g., 1A, blank = pick one away from similar vendors): ").strip()
+            if stall:
+                position = parse_seat_label(stall)
+                if not position or not stall_fits(event, position):
+                    print("\n❌ That stall doesn't exist or is taken!")
+                    pause()
+                    continue
+                record['stalls'] = {selected['vendor']: list(position)}
+            status = 'approved'
+            message = input("Message to vendor (optional): ").strip()
+        elif decision == '2':
+            status = 'rejected'
+            message = input("Rejection reason: ").strip()
         else:
-            print("\n❌ Invalid application number!")
+            print("\n❌ Invalid choice!")
             pause()
-    except ValueError:
-        print("\n❌ Invalid input!")
+            continue
+        
+        # only this application is saved, with one journal record; its status
+        # (and the event's vendor counts and stalls) change as the record is applied
+        record.update(status=status, message=message)
+        if append_journal(record):
+            print(f"\n✅ Application {status}!")
+            if status == 'approved':
+                stall = load_event(selected['event_id'])['vendor_bookings'][selected['vendor']].get('stall')
+                print(f"Stall: {stall}")
+        else:
+            print("\n❌ No stalls left for this event (or the stall was just taken)!")
+        pause()
+
+def bulk_review_applications():
+    """Approve or reject every pending application matching some filters at once"""
+    clear_screen()
+    print_header("BULK REVIEW")
+    
+    print("\nLeave a filter blank to match everything.")
+    event_id = input("Event ID: ").strip()
+    business_type = input("Business Type: ").strip()
+    applied_before = input("Applied before (e.g., 2025-01-15 or 2025-01-15 18:00:00): ").strip()
+    
+    applications = find_pending_applications(event_id, business_type, applied_before)
+    
+    if not applications:
+        print("\n❌ No pending applications match.")
+        pause()
+        return
+    
+    print(f"\n{len(applications)} pending applications match.")
+    print("\n1. Approve (oldest first, up to the stalls left)")
+    print("2. Reject")
+    
+    decision = input("\nChoice: ").strip()
+    
+    if decision == '1':
+        status = 'approved'
+        limit = input("Approve at most how many? (blank = as many as fit): ").strip()
+        if limit and not limit.isdigit():
+            print("\n❌ Invalid number!")
+            pause()
+            return
+        limit = int(limit) if limit else None
+        message = input("Message to vendors (optional): ").strip()
+    elif decision == '2':
+        status, limit = 'rejected', None
+        message = input("Rejection reason: ").strip()
+    else:
+        print("\n❌ Invalid choice!")
         pause()
+        return
+    
+    plan = plan_bulk_decision(applications, status, limit)
+    count = sum(len(vendors) for vendors in plan.values())
+    
+    if not count:
+        print("\n❌ No stalls left in these events!")
+        pause()
+        return
+    
+    confirm = input(f"\n{'Approve' if status == 'approved' else 'Reject'} {count} applications "
+                    f"in {len(plan)} event(s)? (yes/no): ").strip().lower()
+    if confirm != 'yes':
+        print("\n❌ Bulk review cancelled.")
+        pause()
+        return
+    
+    for event_id, ok in apply_bulk_decision(plan, status, message).items():
+        if ok:
+            print(f"✅ {event_id}: {len(plan[event_id])} applications {status}")
+        else:
+            print(f"❌ {event_id}: not saved, its applications or stalls changed meanwhile")
+    pause()
+
+def gate_check_in():
+    """Scan tickets at the event entrance"""
+    clear_screen()
+    print_header("GATE CHECK-IN")
+    
+    event_id = input("Event ID (blank = any event): ").strip()
+    path = input("File with ticket IDs/codes (blank = type/scan them here): ").strip()
+    
+    if path:
+        try:
+            with open(path, 'r') as f:
+                scan_tickets(f, event_id)
+        except FileNotFoundError:
+            print("\n❌ File not found!")
+    else:
+        print("\nScan tickets, empty line to stop:")
+        scan_tickets(iter(lambda: input(), ""), event_id)
+    
+    pause()
+
+def scan_tickets(lines, event_id=""):
+    """Check in every ticket id or ticket code in lines and print a summary"""
+    counts = {'ok': 0, 'duplicate': 0, 'cancelled': 0, 'invalid': 0, 'wrong_event': 0}
+    start = time.perf_counter()
+    
+    for line in lines:
+        ticket_id = line.strip()
+        if not ticket_id:
+            continue
+        
+        if "." in ticket_id:
+            result, booking = check_in_code(ticket_id, event_id)
+        else:
+            result, booking = check_in(ticket_id, event_id)
+        counts[result] += 1
+        
+        if result == 'ok':
+            print(f"✅ {booking['ticket_id']} - Seat {booking['seat']} - {booking.get('user', 'ticket code')}")
+        elif result == 'duplicate':
+            print(f"⚠️  {ticket_id} - ALREADY CHECKED IN at {booking['checked_in']}")
+        elif result == 'cancelled':
+            print(f"❌ {ticket_id} - TICKET WAS CANCELLED")
+        elif result == 'wrong_event':
+            print(f"❌ {ticket_id} - ticket is for {booking['event_id']}")
+        else:
+            print(f"❌ {ticket_id} - INVALID TICKET")
+    
+    elapsed = time.perf_counter() - start
+    scanned = sum(counts.values())
+    print(f"\n{'─'*60}")
+    print(f"Scanned: {scanned}  Admitted: {counts['ok']}  Duplicates: {counts['duplicate']}  "
+          f"Rejected: {counts['invalid'] + counts['cancelled'] + counts['wrong_event']}")
+    if scanned and elapsed > 0:
+        print(f"Rate: {scanned / elapsed * 60:.0f} scans/minute")
+    return counts
 
 def view_statistics():
     """View platform statistics"""
     clear_screen()
     print_header("PLATFORM STATISTICS")
     
-    users = load_users()
-    events = load_events()
+    role_counts = count_users_by_role()
+    event_stats = get_booking_stats()
     
-    total_events = len(events)
-    total_users = len([u for u in users.values() if u['role'] == 'user'])
-    total_vendors = len([v for v in users.values() if v['role'] == 'vendor'])
+    total_events = len(event_stats)
+    total_users = role_counts.get('user', 0)
+    total_vendors = role_counts.get('vendor', 0)
     
     total_bookings = 0
     total_revenue = 0
     
-    for event in events.values():
-        bookings_count = len(event['bookings'])
+    for event in event_stats:
+        bookings_count = event['bookings']
         total_bookings += bookings_count
         total_revenue += bookings_count * event['price']
     
@@ -1025,15 +4188,21 @@ def view_statistics():
     print(f"Total Vendors: {total_vendors}")
     print(f"Total Bookings: {total_bookings}")
     print(f"Total Revenue: {total_revenue:.2f}")
+    print(f"File Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+    
+    for event_id, stats in admission_stats().items():
+        print(f"Queue {event_id}: {stats['depth']} waiting (max {stats['max_depth']}), "
+              f"{stats['active']} checking out, {stats['admitted']} admitted, "
+              f"wait avg {stats['avg_wait']:.1f} s / p95 {stats['p95_wait']:.1f} s")
     
     print(f"\n{'─'*60}")
     print("EVENT-WISE BREAKDOWN")
     print(f"{'─'*60}")
     
-    for event in events.values():
-        bookings_count = len(event['bookings'])
+    for event in event_stats:
+        bookings_count = event['bookings']
         revenue = bookings_count * event['price']
-        total_seats = get_total_seats(event)
+        total_seats = event['total_seats']
         if total_seats > 0:
             occupancy = (bookings_count / total_seats * 100)
         else: 
@@ -1096,4 +4265,25 @@ def main():
     print("="*60 + "\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if "--import-json" in sys.argv:
+        # one-shot migration of the JSON files into the sqlite database
+        import_json_to_sqlite()
+    elif "--bench-payments" in sys.argv:
+        benchmark_payments()
+    elif "--bench-admission" in sys.argv:
+        benchmark_admission()
+    elif "--scan" in sys.argv:
+        # gate scanner: projectcode111.py --scan [file] [--event ID], stdin if no file
+        initialize_files()
+        args = sys.argv[sys.argv.index("--scan") + 1:]
+        scan_event = ""
+        if "--event" in args:
+            scan_event = args[args.index("--event") + 1]
+            args = args[:args.index("--event")]
+        if args and args[0] != "-":
+            with open(args[0], 'r') as f:
+                scan_tickets(f, scan_event)
+        else:
+            scan_tickets(sys.stdin, scan_event)
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,310 @@
+"""Tests of the storage layer: journals, compaction, both backends, refunds and check-in
+
+Run from this folder with: python -m unittest test_projectcode111
+
+Every scenario runs in fresh processes (the program keeps its caches in module
+globals and picks the backend when it is imported), inside a temporary copy
+of the sample data files.
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)  # the worker processes start in the temporary folder
+
+SAMPLE_FILES = ("events.json", "users.json", "user_bookings.json")
+TIME = "2026-01-01 00:00:00"
+
+# ============= WORKERS (run in their own processes) ===============
+
+def open_storage():
+    """Import the program in this process and set up storage/payments"""
+    import projectcode111 as m
+    m.initialize_files()
+    m.set_payment_provider(m.LocalPaymentStub(latency=0, failure_rate=0))
+    return m
+
+def prepare_storage():
+    """Migrate the sample data once, before processes use it at the same time"""
+    open_storage()
+
+def book_one_by_one(event_id, seats, username, barrier, compact_every):
+    """Book seats one journal record each, returns the seats that were ours"""
+    m = open_storage()
+    m.JOURNAL_COMPACT_EVERY = compact_every
+    barrier.wait()
+    won = []
+    for row, seat in seats:
+        if m.append_journal({'op': 'book', 'event_id': event_id, 'seats': [[row, seat]],
+                             'tickets': [m.new_id("TKT")], 'user': username, 'time': TIME}):
+            won.append((row, seat))
+    return won
+
+def keep_compacting(event_id, barrier, rounds):
+    """Rotate an event's journal and the manifest journal over and over"""
+    import time
+    m = open_storage()
+    barrier.wait()
+    for _ in range(rounds):
+        m.compact_event(event_id, m.load_event_file(event_id)['journal_generation'])
+        m.compact_manifest(m.manifest_snapshot()[1])
+        time.sleep(0.005)
+    return m.load_event_file(event_id)['journal_generation']
+
+def read_bookings(event_id):
+    """Get (seat label -> user, available seats, summary available seats) read from storage"""
+    m = open_storage()
+    event = m.load_event(event_id)
+    summary = m.get_event_summaries()[event_id]
+    return ({label: info['user'] for label, info in event['bookings'].items()},
+            m.get_available_seats(event), summary['available_seats'])
+
+def cancel_same_ticket(label, barrier):
+    """Cancel alice's ticket for a seat of event1 at the same time as other processes"""
+    m = open_storage()
+    barrier.wait()
+    return m.cancel_ticket('alice', 'event1', label)[0]
+
+def book(m, seats, username, price=None):
+    """Book seats of event1 with book_seats, returns the ticket ids or None"""
+    success, record = m.book_seats(m.load_event('event1'), seats, username, price)
+    return record['tickets'] if success else None
+
+def scripted_changes():
+    """Make the same bookings and vendor changes on whichever backend is set
+    returns the resulting state without generated ids"""
+    m = open_storage()
+    results = [
+        book(m, [(2, 2), (2, 3)], 'alice', 10.0) is not None,
+        book(m, [(2, 3), (2, 4)], 'bob', 10.0) is not None,  # 3D is taken, so 3E isn't booked either
+        book(m, [(2, 4)], 'bob', 10.0) is not None,
+        m.cancel_ticket('alice', 'event1', '3C')[1]['amount'],
+        m.cancel_ticket('alice', 'event1', '3C')[0],
+        m.append_journal({'op': 'vendor_apply', 'event_id': 'missing', 'vendor': 'v', 'application': {
+            'status': 'pending', 'time': TIME, 'business_name': "", 'business_type': "", 'description': ""}}),
+    ]
+    for i in range(4):
+        results.append(m.append_journal({'op': 'vendor_apply', 'event_id': 'event3', 'vendor': f'v{i}',
+                                         'application': {'status': 'pending', 'time': f'2026-01-0{4 - i} 10:00:00',
+                                                         'business_name': f'B{i}', 'business_type': 'Food',
+                                                         'description': ""}}))
+    results.append(m.append_journal({'op': 'vendor_status', 'event_id': 'event3', 'vendor': 'v2',
+                                     'status': 'approved'}))
+
+    m.invalidate_cache()
+    event = m.load_event('event1')
+    stalls = m.load_event('event3')
+    total, page = m.get_pending_applications()
+    return {
+        'results': results,
+        'bookings': {label: (info['user'], info.get('price'), bool(info.get('group_id')))
+                     for label, info in event['bookings'].items()},
+        'available': m.get_available_seats(event),
+        'refunds': sorted((r['user'], r['seat'], r['amount']) for r in event['refunds'].values()),
+        'applications': {vendor: (app['status'], app.get('stall'))
+                         for vendor, app in stalls['vendor_bookings'].items()},
+        'pending': (total, [(item['event_id'], item['vendor']) for item in page]),
+        'my_bookings': sorted(b['seat'] for b in m.get_user_tickets('bob')),
+    }
+
+def refund_flow():
+    """Refund amounts, owed refunds and their retry"""
+    m = open_storage()
+
+    class FailingRefunds(m.LocalPaymentStub):
+        def _refund(self, refund_id, amount, reference):
+            return {'ok': False, 'refund_id': "", 'amount': amount, 'reference': reference, 'reason': "down"}
+
+    book(m, [(4, 0)], 'alice', 10.0)
+    m.append_journal({'op': 'update', 'event_id': 'event1', 'fields': {'price': 999.0}})
+    refunded = m.cancel_ticket('alice', 'event1', '5A')[1]['amount']
+
+    book(m, [(4, 1)], 'alice', 12.5)
+    m.set_payment_provider(FailingRefunds(latency=0, failure_rate=0))
+    failed = m.cancel_ticket('alice', 'event1', '5B')[1]['ok']
+    owed = [(event_id, refund['amount']) for event_id, _, refund in m.get_owed_refunds()]
+    m.set_payment_provider(m.LocalPaymentStub(latency=0, failure_rate=0))
+    settled = [result['ok'] for _, _, result in m.settle_owed_refunds()]
+    return refunded, failed, owed, settled, m.get_owed_refunds()
+
+def checkin_flow():
+    """Gate results for ticket codes and ids"""
+    m = open_storage()
+    used, cancelled = book(m, [(6, 0)], 'alice'), book(m, [(6, 1)], 'alice')
+    used_code = m.ticket_code('event1', '7A', used[0])
+    cancelled_code = m.ticket_code('event1', '7B', cancelled[0])
+
+    results = {
+        'first': m.check_in_code(used_code)[0],
+        'again': m.check_in_code(used_code)[0],
+        'by_id': m.check_in(used[0])[0],
+        'cancel_used': m.cancel_ticket('alice', 'event1', '7A'),
+        'cancel': m.cancel_ticket('alice', 'event1', '7B')[0],
+        'cancelled': m.check_in_code(cancelled_code)[0],
+        'forged': m.check_in_code(used_code[:-2] + ("AA" if not used_code.endswith("AA") else "BB"))[0],
+        'wrong_event': m.check_in_code(used_code, 'event2')[0],
+        'pipe': m.verify_ticket_code(m.ticket_code("fest|2026", '1A', 'TKT1')),
+    }
+    results['still_booked'] = '7A' in m.load_event('event1')['bookings']
+    return results
+
+# ================= TESTS ==========================
+
+class StorageTestCase(unittest.TestCase):
+    """Runs each test in a temporary copy of the sample data"""
+
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.old_env = dict(os.environ)
+        os.environ.update(CARNIVAL_PAYMENT_LATENCY="0", CARNIVAL_PAYMENT_FAILURE_RATE="0")
+        self.use_backend('json')
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        os.environ.clear()
+        os.environ.update(self.old_env)
+
+    def use_backend(self, backend):
+        """Switch to a backend, in a fresh copy of the sample data
+        (sqlite would otherwise import what the JSON storage holds)"""
+        folder = tempfile.mkdtemp(prefix="carnival-test-")
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        for name in SAMPLE_FILES:
+            shutil.copy(os.path.join(HERE, name), folder)
+        os.chdir(folder)
+        os.environ['CARNIVAL_STORAGE'] = backend
+
+    def run_in_processes(self, calls):
+        """Run (function, args...) tuples in fresh processes at the same time, returns their results"""
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(calls), mp_context=context) as pool:
+            futures = [pool.submit(*call) for call in calls]
+            return [future.result(timeout=300) for future in futures]
+
+    def run_alone(self, function, *args):
+        return self.run_in_processes([(function, *args)])[0]
+
+    def barrier(self, parties):
+        if not hasattr(self, 'manager'):
+            self.manager = multiprocessing.get_context('spawn').Manager()
+            self.addCleanup(self.manager.shutdown)
+        return self.manager.Barrier(parties)
+
+class JournalTest(StorageTestCase):
+
+    def check_conflicting_bookings(self, compact_every):
+        self.run_alone(prepare_storage)  # migrate the sample data once
+        shared = [(row, seat) for row in (2, 3) for seat in range(15)]
+        barrier = self.barrier(4)
+        calls = []
+        for i in range(4):
+            order = shared[:]
+            random.Random(i).shuffle(order)
+            own = [(4 + i, seat) for seat in range(10)]
+            calls.append((book_one_by_one, 'event2', order + own, f'user{i}', barrier, compact_every))
+        won = self.run_in_processes(calls)
+
+        # every seat everyone wanted went to exactly one of them; their own seats all got booked
+        shared_won = [seat for seats in won for seat in seats if seat in shared]
+        self.assertEqual(sorted(shared_won), sorted(shared))
+        for i, seats in enumerate(won):
+            self.assertTrue(set((4 + i, seat) for seat in range(10)) <= set(seats))
+
+        bookings, available, summary_available = self.run_alone(read_bookings, 'event2')
+        for i, seats in enumerate(won):
+            for row, seat in seats:
+                self.assertEqual(bookings[f"{row + 1}{chr(65 + seat)}"], f'user{i}')
+        self.assertEqual(available, 150 - 1 - 30 - 40)  # 1B was booked in the sample data
+        self.assertEqual(summary_available, available)
+
+    def test_conflicting_appends_json_across_compactions(self):
+        self.check_conflicting_bookings(compact_every=5)
+
+    def test_conflicting_appends_sqlite(self):
+        self.use_backend('sqlite')
+        self.check_conflicting_bookings(compact_every=5)
+
+    def test_compaction_racing_writers(self):
+        self.run_alone(prepare_storage)
+        barrier = self.barrier(4)
+        calls = [(book_one_by_one, 'event2', [(2 + i, seat) for seat in range(15)], f'user{i}', barrier, 10 ** 6)
+                 for i in range(3)]
+        calls.append((keep_compacting, 'event2', barrier, 40))
+        *won, generation = self.run_in_processes(calls)
+
+        self.assertTrue(all(len(seats) == 15 for seats in won))
+        self.assertGreater(generation, 0)
+        bookings, available, summary_available = self.run_alone(read_bookings, 'event2')
+        self.assertEqual(len(bookings), 1 + 45)
+        self.assertEqual(summary_available, available)
+
+        # only the journal of the current generation is left
+        journals = [name for name in os.listdir("events") if name.startswith("event2.journal")]
+        self.assertEqual(len(journals), 1)
+        with open(os.path.join("events", "event2.json")) as f:
+            self.assertEqual(json.load(f)['journal_generation'], int(journals[0].rsplit(".", 1)[-1]))
+
+class BackendParityTest(StorageTestCase):
+
+    def test_same_results_on_both_backends(self):
+        results = {}
+        for backend in ('json', 'sqlite'):
+            with self.subTest(backend=backend):
+                self.use_backend(backend)
+                results[backend] = self.run_alone(scripted_changes)
+        self.assertEqual(results['json']['results'], [True, False, True, 10.0, False, False,
+                                                      True, True, True, True, True])
+        self.assertEqual(results['json']['pending'], (3, [('event3', 'v3'), ('event3', 'v1'), ('event3', 'v0')]))
+        for key in results['json']:
+            self.assertEqual(results['json'][key], results['sqlite'][key], key)
+
+class RefundTest(StorageTestCase):
+
+    def test_refunds(self):
+        for backend in ('json', 'sqlite'):
+            with self.subTest(backend=backend):
+                self.use_backend(backend)
+                refunded, failed, owed, settled, owed_after = self.run_alone(refund_flow)
+                self.assertEqual(refunded, 10.0)  # what was paid, not the price now
+                self.assertFalse(failed)
+                self.assertEqual(owed, [('event1', 12.5)])
+                self.assertEqual(settled, [True])
+                self.assertEqual(owed_after, [])
+
+    def test_one_refund_when_cancelled_at_once(self):
+        for backend in ('json', 'sqlite'):
+            with self.subTest(backend=backend):
+                self.use_backend(backend)
+                self.run_alone(prepare_storage)
+                self.run_alone(book_one_by_one, 'event1', [(2, 2)], 'alice', self.barrier(1), 200)
+                barrier = self.barrier(4)
+                results = self.run_in_processes([(cancel_same_ticket, '3C', barrier)] * 4)
+                self.assertEqual(results.count(True), 1)
+
+class CheckInTest(StorageTestCase):
+
+    def test_checkin(self):
+        for backend in ('json', 'sqlite'):
+            with self.subTest(backend=backend):
+                self.use_backend(backend)
+                results = self.run_alone(checkin_flow)
+                self.assertEqual(results['first'], 'ok')
+                self.assertEqual(results['again'], 'duplicate')
+                self.assertEqual(results['by_id'], 'duplicate')
+                self.assertEqual(results['cancel_used'], (False, "This ticket was already used at the gate"))
+                self.assertTrue(results['still_booked'])
+                self.assertTrue(results['cancel'])
+                self.assertEqual(results['cancelled'], 'cancelled')
+                self.assertEqual(results['forged'], 'invalid')
+                self.assertEqual(results['wrong_event'], 'wrong_event')
+                self.assertEqual(results['pipe'], ("fest|2026", '1A', 'TKT1'))
+
+if __name__ == '__main__':
+    unittest.main()